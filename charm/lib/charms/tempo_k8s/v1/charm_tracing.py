@@ -45,6 +45,15 @@ import opentelemetry
 By default, the tracer is named after the charm type. If you wish to override that, you can pass
 a different `service_name` argument to `trace_charm`.
 
+The spans are not sent when the charm exits: they are spooled to disk in the charm directory,
+and the next dispatch that has a tracing endpoint ships them from a background process. Hooks
+therefore never wait on the tracing backend; the price is that a trace shows up in Tempo one
+dispatch late, and that up to `SPOOL_MAX_FILES` dispatches' worth of spans are kept while the
+backend cannot be reached. Spans the backend rejects as invalid (a 4xx response) are dropped.
+When the backend cannot be reached, charm tracing is skipped altogether for a while, from
+`CIRCUIT_MIN_BACKOFF` seconds up to `CIRCUIT_MAX_BACKOFF` as failures repeat, so the dispatches
+in between record no spans.
+
 *Upgrading from `v0`:*
 
 If you are upgrading from `charm_tracing` v0, you need to take the following steps (assuming you already
@@ -102,14 +111,26 @@ needs to be replaced with:
 the certificate file.
 """
 
+import fnmatch
 import functools
 import inspect
+import json
 import logging
 import os
+import random
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
 from contextlib import contextmanager
 from contextvars import Context, ContextVar, copy_context
+from dataclasses import dataclass
 from pathlib import Path
 from typing import (
+    TYPE_CHECKING,
     Any,
     Callable,
     Generator,
@@ -121,22 +142,15 @@ from typing import (
     cast,
 )
 
-import opentelemetry
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import Span, TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.trace import INVALID_SPAN, Tracer
-from opentelemetry.trace import get_current_span as otlp_get_current_span
-from opentelemetry.trace import (
-    get_tracer,
-    get_tracer_provider,
-    set_span_in_context,
-    set_tracer_provider,
-)
 from ops.charm import CharmBase
 from ops.framework import Framework
 
+# The opentelemetry SDK and exporter take a while to import: they are only
+# imported once a dispatch turns out to have a tracing endpoint to send spans to.
+if TYPE_CHECKING:
+    from opentelemetry.sdk.trace import Span
+    from opentelemetry.trace import Tracer
+
 # The unique Charmhub library identifier, never change it
 LIBID = "cb1705dcd1a14ca09b2e60187d1215c7"
 
@@ -146,17 +160,33 @@ LIBAPI = 1
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
 
-LIBPATCH = 10
+LIBPATCH = 16
 
 PYDEPS = ["opentelemetry-exporter-otlp-proto-http==1.21.0"]
 
 logger = logging.getLogger("tracing")
 
-tracer: ContextVar[Tracer] = ContextVar("tracer")
+tracer: "ContextVar[Tracer]" = ContextVar("tracer")
 _GetterType = Union[Callable[[CharmBase], Optional[str]], property]
 
 CHARM_TRACING_ENABLED = "CHARM_TRACING_ENABLED"
 
+# Spans are spooled to disk when a dispatch ends, and shipped to the tracing
+# endpoint in the background by the next traced dispatch, so that a slow or
+# unreachable backend does not hold up hooks.
+SPOOL_DIR_NAME = ".charm_tracing_spool"
+SPOOL_MAX_FILES = 100
+SHIP_TIMEOUT = 10
+# A file claimed by a shipper for longer than this is put back in the spool: that shipper died.
+SHIP_CLAIM_TIMEOUT = 6 * SHIP_TIMEOUT
+# The backend may accept these once it recovers; other 4xx responses mean it never will.
+SHIP_RETRY_STATUSES = (408, 429)
+# After the shipper fails to reach the endpoint, dispatches skip tracing altogether for a
+# while, doubling with each consecutive failure, so that a dead backend costs nothing.
+CIRCUIT_FILE_NAME = "circuit.json"
+CIRCUIT_MIN_BACKOFF = 30
+CIRCUIT_MAX_BACKOFF = 3600
+
 
 def is_enabled() -> bool:
     """Whether charm tracing is enabled."""
@@ -175,16 +205,23 @@ def charm_tracing_disabled():
     os.environ[CHARM_TRACING_ENABLED] = previous
 
 
-def get_current_span() -> Union[Span, None]:
+def get_current_span() -> Union["Span", None]:
     """Return the currently active Span, if there is one, else None.
 
     If you'd rather keep your logic unconditional, you can use opentelemetry.trace.get_current_span,
     which will return an object that behaves like a span but records no data.
     """
+    if not _get_tracer():
+        # Nothing is being traced in this dispatch.
+        return None
+
+    from opentelemetry.trace import INVALID_SPAN
+    from opentelemetry.trace import get_current_span as otlp_get_current_span
+
     span = otlp_get_current_span()
     if span is INVALID_SPAN:
         return None
-    return cast(Span, span)
+    return cast("Span", span)
 
 
 def _get_tracer_from_context(ctx: Context) -> Optional[ContextVar]:
@@ -194,7 +231,7 @@ def _get_tracer_from_context(ctx: Context) -> Optional[ContextVar]:
     return None
 
 
-def _get_tracer() -> Optional[Tracer]:
+def _get_tracer() -> Optional["Tracer"]:
     """Find tracer in context variable and as a fallback locate it in the full context."""
     try:
         return tracer.get()
@@ -210,11 +247,11 @@ def _get_tracer() -> Optional[Tracer]:
 
 
 @contextmanager
-def _span(name: str) -> Generator[Optional[Span], Any, Any]:
+def _span(name: str) -> Generator[Optional["Span"], Any, Any]:
     """Context to create a span if there is a tracer, otherwise do nothing."""
     if tracer := _get_tracer():
         with tracer.start_as_current_span(name) as span:
-            yield cast(Span, span)
+            yield cast("Span", span)
     else:
         yield None
 
@@ -224,6 +261,40 @@ _T = TypeVar("_T", bound=type)
 _F = TypeVar("_F", bound=Type[Callable])
 
 
+@dataclass(frozen=True)
+class SamplingPolicy:
+    """Which methods are traced, and which dispatches' traces are sent.
+
+    Methods are named after the type they are called on, e.g. "MyCharm._on_start", and
+    matched against the ``include`` and ``exclude`` glob patterns. Once a dispatch is over,
+    its trace is sent if it recorded an error, took at least ``slow_dispatch`` seconds (unless
+    that is 0), or else with probability ``ratio``.
+    """
+
+    ratio: float = 1.0
+    slow_dispatch: float = 0.0
+    include: Sequence[str] = ("*",)
+    exclude: Sequence[str] = ()
+
+    def traces(self, name: str) -> bool:
+        """Whether calls to the named method get a span."""
+        return any(fnmatch.fnmatchcase(name, p) for p in self.include) and not any(
+            fnmatch.fnmatchcase(name, p) for p in self.exclude
+        )
+
+    def keeps(self, spans: Sequence["Span"]) -> bool:
+        """Whether to send the trace made of these spans."""
+        from opentelemetry.trace import StatusCode
+
+        if any(span.status.status_code is StatusCode.ERROR for span in spans):
+            return True
+        if self.slow_dispatch > 0:
+            duration = max((span.end_time or 0) - (span.start_time or 0) for span in spans)
+            if duration >= self.slow_dispatch * 1e9:
+                return True
+        return random.random() < self.ratio
+
+
 class TracingError(RuntimeError):
     """Base class for errors raised by this module."""
 
@@ -254,6 +325,21 @@ def _get_tracing_endpoint(tracing_endpoint_getter, self, charm):
     return f"{tracing_endpoint}/v1/traces"
 
 
+def _get_sampling_policy(sampling_policy_getter, self, charm) -> SamplingPolicy:
+    try:
+        if isinstance(sampling_policy_getter, property):
+            policy = sampling_policy_getter.__get__(self)
+        else:  # method or callable
+            policy = sampling_policy_getter(self)
+    except Exception:
+        logger.exception(
+            f"exception retrieving the sampling policy from {charm}.{sampling_policy_getter}; "
+            f"tracing everything."
+        )
+        return SamplingPolicy()
+    return policy or SamplingPolicy()
+
+
 def _get_server_cert(server_cert_getter, self, charm):
     if isinstance(server_cert_getter, property):
         server_cert = server_cert_getter.__get__(self)
@@ -273,13 +359,144 @@ def _get_server_cert(server_cert_getter, self, charm):
     return server_cert
 
 
+def _spool_dir() -> Path:
+    """Where spans wait to be shipped: next to the unit state, in the charm directory."""
+    return Path(os.getenv("JUJU_CHARM_DIR", ".")) / SPOOL_DIR_NAME
+
+
+def _spool_spans(spool_dir: Path, spans: Sequence["Span"]):
+    """Write the spans to the spool as an OTLP request, dropping the oldest ones beyond the limit."""
+    if not spans:
+        return
+    from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    payload = encode_spans(spans).SerializePartialToString()
+    # Written aside and renamed, so that the shipper never sees a partial file.
+    fd, tmp = tempfile.mkstemp(dir=spool_dir, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(payload)
+    os.rename(tmp, spool_dir / f"{time.time_ns()}.spans")
+
+    _reclaim_stale_claims(spool_dir)
+    spooled = sorted(spool_dir.glob("*.spans"))
+    for stale in spooled[:-SPOOL_MAX_FILES]:
+        logger.warning(f"tracing spool full: dropping {stale.name}")
+        stale.unlink(missing_ok=True)
+
+
+def _reclaim_stale_claims(spool_dir: Path):
+    """Put back in the spool the files claimed by shippers that died before sending them."""
+    for claimed in spool_dir.glob("*.shipping"):
+        try:
+            if time.time() - claimed.stat().st_mtime > SHIP_CLAIM_TIMEOUT:
+                claimed.rename(claimed.with_suffix(".spans"))
+        except FileNotFoundError:
+            continue
+
+
+def _start_shipper(spool_dir: Path, endpoint: str, server_cert: Optional[Union[str, Path]]):
+    """Ship the spooled spans from a detached process, if there are any."""
+    _reclaim_stale_claims(spool_dir)
+    if not any(spool_dir.glob("*.spans")):
+        return
+    code = "import sys; from charms.tempo_k8s.v1.charm_tracing import _ship; _ship(*sys.argv[1:])"
+    args = [sys.executable, "-c", code, str(spool_dir), endpoint]
+    if server_cert:
+        args.append(str(Path(server_cert).absolute()))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    try:
+        subprocess.Popen(
+            args,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        logger.exception("failed to start the span shipper")
+
+
+def _read_circuit(spool_dir: Path, endpoint: str) -> dict:
+    """The state of the circuit to the endpoint: its consecutive failures, and until when it is open."""
+    try:
+        state = json.loads((spool_dir / CIRCUIT_FILE_NAME).read_text())
+    except (OSError, ValueError):
+        return {}
+    # A new endpoint gets a closed circuit.
+    return state if isinstance(state, dict) and state.get("endpoint") == endpoint else {}
+
+
+def _circuit_open(spool_dir: Path, endpoint: str) -> bool:
+    """Whether the endpoint failed recently enough that tracing should be skipped."""
+    return time.time() < _read_circuit(spool_dir, endpoint).get("open_until", 0)
+
+
+def _trip_circuit(spool_dir: Path, endpoint: str):
+    """Record a failure to reach the endpoint, and open the circuit for a while."""
+    failures = _read_circuit(spool_dir, endpoint).get("failures", 0) + 1
+    backoff = min(CIRCUIT_MIN_BACKOFF * 2 ** (failures - 1), CIRCUIT_MAX_BACKOFF)
+    state = {"endpoint": endpoint, "failures": failures, "open_until": time.time() + backoff}
+    fd, tmp = tempfile.mkstemp(dir=spool_dir, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f)
+    os.rename(tmp, spool_dir / CIRCUIT_FILE_NAME)
+
+
+def _ship(spool_dir: str, endpoint: str, server_cert: Optional[str] = None):
+    """Send the spooled spans to the endpoint, oldest first, until one fails to be sent.
+
+    Each file is claimed by renaming it first, so that concurrent shippers don't
+    send it twice; it is put back if the backend could not be reached, or failed,
+    and the circuit to the endpoint is opened. A file the backend rejects is dropped,
+    as sending it again would not help. Reaching the backend closes the circuit.
+    """
+    context = ssl.create_default_context(cafile=server_cert) if server_cert else None
+    for spooled in sorted(Path(spool_dir).glob("*.spans")):
+        claimed = spooled.with_suffix(".shipping")
+        try:
+            spooled.rename(claimed)
+            # The claim's age tells whether its shipper is still alive.
+            os.utime(claimed)
+        except FileNotFoundError:
+            continue
+        request = urllib.request.Request(
+            endpoint,
+            data=claimed.read_bytes(),
+            headers={"Content-Type": "application/x-protobuf"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=SHIP_TIMEOUT, context=context):
+                pass
+        except urllib.error.HTTPError as e:
+            if e.code >= 500 or e.code in SHIP_RETRY_STATUSES:
+                claimed.rename(spooled)
+                _trip_circuit(Path(spool_dir), endpoint)
+                return
+            logger.warning(f"tracing backend rejected {spooled.name} ({e.code}): dropping it")
+        except OSError:
+            claimed.rename(spooled)
+            _trip_circuit(Path(spool_dir), endpoint)
+            return
+        claimed.unlink()
+        (Path(spool_dir) / CIRCUIT_FILE_NAME).unlink(missing_ok=True)
+
+
 def _setup_root_span_initializer(
     charm: Type[CharmBase],
     tracing_endpoint_getter: _GetterType,
     server_cert_getter: Optional[_GetterType],
     service_name: Optional[str] = None,
+    instrumented_types: Sequence[type] = (),
+    sampling_policy_getter: Optional[_GetterType] = None,
 ):
-    """Patch the charm's initializer."""
+    """Patch the charm's initializer.
+
+    The ``instrumented_types`` are only instrumented once a dispatch has a tracing
+    endpoint: without one, their methods are called as they are, at no cost.
+    """
     original_init = charm.__init__
 
     @functools.wraps(original_init)
@@ -298,19 +515,6 @@ def _setup_root_span_initializer(
         _service_name = service_name or f"{self.app.name}-charm"
 
         unit_name = self.unit.name
-        resource = Resource.create(
-            attributes={
-                "service.name": _service_name,
-                "compose_service": _service_name,
-                "charm_type": type(self).__name__,
-                # juju topology
-                "juju_unit": unit_name,
-                "juju_application": self.app.name,
-                "juju_model": self.model.name,
-                "juju_model_uuid": self.model.uuid,
-            }
-        )
-        provider = TracerProvider(resource=resource)
         try:
             tracing_endpoint = _get_tracing_endpoint(tracing_endpoint_getter, self, charm)
         except Exception:
@@ -326,21 +530,49 @@ def _setup_root_span_initializer(
         if not tracing_endpoint:
             return
 
+        if _circuit_open(_spool_dir(), tracing_endpoint):
+            logger.info(f"{tracing_endpoint} recently unreachable; skipping tracing for this run.")
+            return
+
         server_cert: Optional[Union[str, Path]] = (
             _get_server_cert(server_cert_getter, self, charm) if server_cert_getter else None
         )
-
-        exporter = OTLPSpanExporter(
-            endpoint=tracing_endpoint,
-            certificate_file=str(Path(server_cert).absolute()) if server_cert else None,
-            timeout=2,
+        policy = (
+            _get_sampling_policy(sampling_policy_getter, self, charm)
+            if sampling_policy_getter
+            else SamplingPolicy()
         )
 
-        processor = BatchSpanProcessor(exporter)
-        provider.add_span_processor(processor)
+        import opentelemetry
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        from opentelemetry.trace import set_span_in_context, set_tracer_provider
+
+        # Ship what previous dispatches spooled, without waiting for it.
+        _start_shipper(_spool_dir(), tracing_endpoint, server_cert)
+
+        resource = Resource.create(
+            attributes={
+                "service.name": _service_name,
+                "compose_service": _service_name,
+                "charm_type": type(self).__name__,
+                # juju topology
+                "juju_unit": unit_name,
+                "juju_application": self.app.name,
+                "juju_model": self.model.name,
+                "juju_model_uuid": self.model.uuid,
+            }
+        )
+        provider = TracerProvider(resource=resource)
+        exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
         set_tracer_provider(provider)
-        _tracer = get_tracer(_service_name)  # type: ignore
+        _tracer = provider.get_tracer(_service_name)
         _tracer_token = tracer.set(_tracer)
+        for type_ in instrumented_types:
+            _trace_type_once(type_, policy)
 
         dispatch_path = os.getenv("JUJU_DISPATCH_PATH", "")  # something like hooks/install
         event_name = dispatch_path.split("/")[1] if "/" in dispatch_path else dispatch_path
@@ -377,9 +609,13 @@ def _setup_root_span_initializer(
             span.end()
             opentelemetry.context.detach(span_token)  # type: ignore
             tracer.reset(_tracer_token)
-            tp = cast(TracerProvider, get_tracer_provider())
-            tp.force_flush(timeout_millis=1000)  # don't block for too long
-            tp.shutdown()
+            spans = exporter.get_finished_spans()
+            try:
+                if policy.keeps(spans):
+                    _spool_spans(_spool_dir(), spans)
+            except OSError:
+                logger.exception("failed to spool the spans of this dispatch; dropping them")
+            provider.shutdown()
             original_close()
 
         framework.close = wrap_close
@@ -393,6 +629,7 @@ def trace_charm(
     server_cert: Optional[str] = None,
     service_name: Optional[str] = None,
     extra_types: Sequence[type] = (),
+    sampling_policy: Optional[str] = None,
 ):
     """Autoinstrument the decorated charm with tracing telemetry.
 
@@ -430,6 +667,9 @@ def trace_charm(
         Defaults to the juju application name this charm is deployed under.
     :param extra_types: pass any number of types that you also wish to autoinstrument.
         For example, charm libs, relation endpoint wrappers, workload abstractions, ...
+    :param sampling_policy: name of a method or property on the charm type that returns an
+        optional `SamplingPolicy`, e.g. built from the charm config. If None, every method is
+        traced, and every trace is sent.
     """
 
     def _decorator(charm_type: Type[CharmBase]):
@@ -440,6 +680,9 @@ def trace_charm(
             server_cert_getter=getattr(charm_type, server_cert) if server_cert else None,
             service_name=service_name,
             extra_types=extra_types,
+            sampling_policy_getter=(
+                getattr(charm_type, sampling_policy) if sampling_policy else None
+            ),
         )
         return charm_type
 
@@ -452,12 +695,16 @@ def _autoinstrument(
     server_cert_getter: Optional[_GetterType] = None,
     service_name: Optional[str] = None,
     extra_types: Sequence[type] = (),
+    sampling_policy_getter: Optional[_GetterType] = None,
 ) -> Type[CharmBase]:
     """Set up tracing on this charm class.
 
     Use this function to get out-of-the-box traces for all events emitted on this charm and all
     method calls on instances of this class.
 
+    The charm type and the extra types are only instrumented when the charm is instantiated in a
+    dispatch that has a tracing endpoint; until then, calling their methods costs nothing extra.
+
     Usage:
 
     >>> from charms.tempo_k8s.v1.charm_tracing import _autoinstrument
@@ -481,6 +728,8 @@ def _autoinstrument(
         Defaults to the juju application name this charm is deployed under.
     :param extra_types: pass any number of types that you also wish to autoinstrument.
         For example, charm libs, relation endpoint wrappers, workload abstractions, ...
+    :param sampling_policy_getter: method or property on the charm type that returns an
+        optional `SamplingPolicy`. If None, every method is traced, and every trace is sent.
     """
     logger.info(f"instrumenting {charm_type}")
     _setup_root_span_initializer(
@@ -488,20 +737,27 @@ def _autoinstrument(
         tracing_endpoint_getter,
         server_cert_getter=server_cert_getter,
         service_name=service_name,
+        instrumented_types=(charm_type, *extra_types),
+        sampling_policy_getter=sampling_policy_getter,
     )
-    trace_type(charm_type)
-    for type_ in extra_types:
-        trace_type(type_)
-
     return charm_type
 
 
-def trace_type(cls: _T) -> _T:
+def _trace_type_once(cls: type, policy: Optional[SamplingPolicy] = None):
+    """Trace this class, unless it already is."""
+    # Checked on the class itself, as a subclass of a traced class needs its own methods traced.
+    if vars(cls).get("_charm_tracing_instrumented"):
+        return
+    trace_type(cls, policy)
+    cls._charm_tracing_instrumented = True  # type: ignore
+
+
+def trace_type(cls: _T, policy: Optional[SamplingPolicy] = None) -> _T:
     """Set up tracing on this class.
 
     Use this decorator to get out-of-the-box traces for all method calls on instances of this class.
     It assumes that this class is only instantiated after a charm type decorated with `@trace_charm`
-    has been instantiated.
+    has been instantiated. If a `SamplingPolicy` is given, only the methods it traces are.
     """
     logger.info(f"instrumenting {cls}")
     for name, method in inspect.getmembers(cls, predicate=inspect.isfunction):
@@ -510,6 +766,9 @@ def trace_type(cls: _T) -> _T:
         if method.__name__.startswith("__"):
             logger.info(f"skipping {method} (dunder)")
             continue
+        if policy and not policy.traces(f"{cls.__name__}.{name}"):
+            logger.info(f"skipping {method} (sampling policy)")
+            continue
 
         new_method = trace_method(method)
         if isinstance(inspect.getattr_static(cls, method.__name__), staticmethod):
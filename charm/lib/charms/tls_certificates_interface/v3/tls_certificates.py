@@ -284,13 +284,8 @@ from contextlib import suppress
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from ipaddress import IPv4Address
-from typing import List, Literal, Optional, Union
+from typing import TYPE_CHECKING, List, Literal, Optional, Union
 
-from cryptography import x509
-from cryptography.hazmat._oid import ExtensionOID
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from jsonschema import exceptions, validate
 from ops.charm import (
     CharmBase,
     CharmEvents,
@@ -309,6 +304,11 @@ from ops.model import (
     Unit,
 )
 
+if TYPE_CHECKING:
+    # cryptography takes a while to import, and most dispatches never touch a certificate,
+    # so each function imports what it needs when it is called.
+    from cryptography import x509
+
 # The unique Charmhub library identifier, never change it
 LIBID = "afd8c2bccf834997afce12c2706d2ede"
 
@@ -317,7 +317,7 @@ LIBAPI = 3
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 15
+LIBPATCH = 18
 
 PYDEPS = ["cryptography", "jsonschema"]
 
@@ -771,6 +771,8 @@ def generate_ca(
     Returns:
         bytes: CA Certificate.
     """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
     private_key_object = serialization.load_pem_private_key(
         private_key, password=private_key_password
     )
@@ -824,10 +826,10 @@ def generate_ca(
 
 def get_certificate_extensions(
     authority_key_identifier: bytes,
-    csr: x509.CertificateSigningRequest,
+    csr: "x509.CertificateSigningRequest",
     alt_names: Optional[List[str]],
     is_ca: bool,
-) -> List[x509.Extension]:
+) -> List["x509.Extension"]:
     """Generate a list of certificate extensions from a CSR and other known information.
 
     Args:
@@ -839,6 +841,8 @@ def get_certificate_extensions(
     Returns:
         List[x509.Extension]: List of extensions
     """
+    from cryptography import x509
+    from cryptography.hazmat._oid import ExtensionOID
     cert_extensions_list: List[x509.Extension] = [
         x509.Extension(
             oid=ExtensionOID.AUTHORITY_KEY_IDENTIFIER,
@@ -944,6 +948,8 @@ def generate_certificate(
     Returns:
         bytes: Certificate
     """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
     csr_object = x509.load_pem_x509_csr(csr)
     subject = csr_object.subject
     ca_pem = x509.load_pem_x509_certificate(ca)
@@ -995,6 +1001,8 @@ def generate_private_key(
     Returns:
         bytes: Private Key
     """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
     private_key = rsa.generate_private_key(
         public_exponent=public_exponent,
         key_size=key_size,
@@ -1011,6 +1019,40 @@ def generate_private_key(
     return key_bytes
 
 
+def generate_ec_private_key(
+    password: Optional[bytes] = None,
+    curve: str = "secp256r1",
+) -> bytes:
+    """Generate an elliptic curve private key.
+
+    ECDSA keys are much faster to generate than RSA keys of equivalent strength,
+    and make for cheaper TLS handshakes.
+
+    Args:
+        password (bytes): Password for decrypting the private key
+        curve (str): Name of the curve, either "secp256r1" (P-256) or "secp384r1" (P-384)
+
+    Returns:
+        bytes: Private Key
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    curves = {"secp256r1": ec.SECP256R1, "secp384r1": ec.SECP384R1}
+    if curve not in curves:
+        raise ValueError(f"Unsupported curve: {curve}")
+    private_key = ec.generate_private_key(curves[curve]())
+    key_bytes = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=(
+            serialization.BestAvailableEncryption(password)
+            if password
+            else serialization.NoEncryption()
+        ),
+    )
+    return key_bytes
+
+
 def generate_csr(  # noqa: C901
     private_key: bytes,
     subject: str,
@@ -1030,7 +1072,7 @@ def generate_csr(  # noqa: C901
     """Generate a CSR using private key and subject.
 
     Args:
-        private_key (bytes): Private key
+        private_key (bytes): Private key, either RSA or elliptic curve
         subject (str): CSR Common Name that can be an IP or a Full Qualified Domain Name (FQDN).
         add_unique_id_to_subject_name (bool): Whether a unique ID must be added to the CSR's
             subject name. Always leave to "True" when the CSR is used to request certificates
@@ -1052,6 +1094,9 @@ def generate_csr(  # noqa: C901
     Returns:
         bytes: CSR
     """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
     signing_key = serialization.load_pem_private_key(private_key, password=private_key_password)
     subject_name = [x509.NameAttribute(x509.NameOID.COMMON_NAME, subject)]
     if add_unique_id_to_subject_name:
@@ -1089,12 +1134,19 @@ def generate_csr(  # noqa: C901
         for extension in additional_critical_extensions:
             csr = csr.add_extension(extension, critical=True)
 
-    signed_certificate = csr.sign(signing_key, hashes.SHA256())  # type: ignore[arg-type]
+    # Match the hash to the strength of P-384 keys; SHA-256 otherwise.
+    algorithm = (
+        hashes.SHA384()
+        if isinstance(signing_key, ec.EllipticCurvePrivateKey) and signing_key.curve.key_size > 256
+        else hashes.SHA256()
+    )
+    signed_certificate = csr.sign(signing_key, algorithm)  # type: ignore[arg-type]
     return signed_certificate.public_bytes(serialization.Encoding.PEM)
 
 
 def get_sha256_hex(data: str) -> str:
     """Calculate the hash of the provided data and return the hexadecimal representation."""
+    from cryptography.hazmat.primitives import hashes
     digest = hashes.Hash(hashes.SHA256())
     digest.update(data.encode())
     return digest.finalize().hex()
@@ -1109,6 +1161,8 @@ def csr_matches_certificate(csr: str, cert: str) -> bool:
     Returns:
         bool: True/False depending on whether the CSR matches the certificate.
     """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import serialization
     try:
         csr_object = x509.load_pem_x509_csr(csr.encode("utf-8"))
         cert_object = x509.load_pem_x509_certificate(cert.encode("utf-8"))
@@ -1145,6 +1199,9 @@ def _relation_data_is_valid(
     Returns:
         bool: Whether relation data is valid.
     """
+    # jsonschema takes a while to import, and most dispatches never validate anything.
+    from jsonschema import exceptions, validate
+
     relation_data = _load_relation_data(relation.data[app_or_unit])
     try:
         validate(instance=relation_data, schema=json_schema)
@@ -1371,6 +1428,7 @@ class TLSCertificatesProvidesV3(Object):
         Returns:
             List: List of ProviderCertificate objects
         """
+        from cryptography import x509
         certificates: List[ProviderCertificate] = []
         relations = (
             [
@@ -1620,6 +1678,7 @@ class TLSCertificatesRequiresV3(Object):
 
     def get_provider_certificates(self) -> List[ProviderCertificate]:
         """Return list of certificates from the provider's relation data."""
+        from cryptography import x509
         provider_certificates: List[ProviderCertificate] = []
         relation = self.model.get_relation(self.relationship_name)
         if not relation:
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""The catalogue all the units serve, as decided by the leader."""
+
+import json
+import logging
+from typing import List, Optional
+
+from ops.charm import CharmBase
+from ops.framework import Object, StoredState
+from ops.model import Relation
+from shards import digest
+
+logger = logging.getLogger(__name__)
+
+# Peer app databag field: the digest of the entries to serve.
+DIGEST_FIELD = "catalogue-digest"
+# Unit databag field: the digest of the entries the unit serves.
+SERVED_FIELD = "served-catalogue-digest"
+
+
+class CatalogueSync(Object):
+    """Have every unit serve the same catalogue entries.
+
+    Each unit sees the catalogue relations change at its own time, so for a
+    while different units would serve different catalogues, with different
+    ETags. Instead, the leader publishes the digest of the entries it serves
+    over the peer relation; the other units only serve the entries they see
+    once those have the same digest, and keep serving the previous ones until
+    then, reporting back the digest of what they serve.
+    """
+
+    _stored = StoredState()
+
+    def __init__(self, charm: CharmBase, relation_name: str):
+        super().__init__(charm, "catalogue-sync")
+        self._charm = charm
+        self._relation_name = relation_name
+        # The entries this unit last served, as JSON.
+        self._stored.set_default(served="")
+
+    @property
+    def _relation(self) -> Optional[Relation]:
+        return self._charm.model.get_relation(self._relation_name)
+
+    def converge(self, items: List[dict]) -> List[dict]:
+        """The entries to serve, given the ones this unit sees.
+
+        The leader serves the entries it sees, and publishes their digest. The other
+        units serve the ones they see if they match that digest, or none is published
+        yet; otherwise, the ones they served last.
+        """
+        relation = self._relation
+        if not relation:
+            return items
+
+        app_data = relation.data[self._charm.app]
+        canonical = digest(items)
+        if self._charm.unit.is_leader():
+            if app_data.get(DIGEST_FIELD) != canonical:
+                app_data[DIGEST_FIELD] = canonical
+            return items
+
+        published = app_data.get(DIGEST_FIELD)
+        if published and published != canonical and self._stored.served:
+            logger.debug("Serving the previous catalogue until the relations catch up")
+            return json.loads(self._stored.served)
+        return items
+
+    def report(self, items: List[dict]):
+        """Keep track of the entries this unit serves, and let the leader know."""
+        self._stored.served = json.dumps(items)
+        if relation := self._relation:
+            relation.data[self._charm.unit][SERVED_FIELD] = digest(items)
+
+    @property
+    def lagging_units(self) -> List[str]:
+        """The peers not serving the entries the leader published yet."""
+        relation = self._relation
+        if not relation:
+            return []
+        canonical = relation.data[self._charm.app].get(DIGEST_FIELD)
+        return sorted(
+            unit.name
+            for unit in relation.units
+            if relation.data[unit].get(SERVED_FIELD) != canonical
+        )
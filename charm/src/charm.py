@@ -8,33 +8,95 @@
 
 import json
 import logging
+import math
+import re
 import socket
 import subprocess
+import time
+from datetime import timedelta
 from pathlib import Path
-from typing import Optional, cast
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional, Sequence, Tuple, cast
 from urllib.parse import urlparse
 
+from catalogue_sync import CatalogueSync
 from charms.catalogue_k8s.v1.catalogue import (
     CatalogueItemsChangedEvent,
     CatalogueProvider,
 )
 from charms.observability_libs.v1.cert_handler import CertHandler
-from charms.tempo_k8s.v1.charm_tracing import trace_charm
+from charms.tempo_k8s.v1.charm_tracing import SamplingPolicy, get_current_span, trace_charm
 from charms.tempo_k8s.v2.tracing import TracingEndpointRequirer
 from charms.traefik_k8s.v2.ingress import (
     IngressPerAppReadyEvent,
     IngressPerAppRequirer,
 )
-from nginx_config import CA_CERT_PATH, CERT_PATH, KEY_PATH, NGINX_CONFIG_PATH, NginxConfigBuilder
-from ops.charm import ActionEvent, CharmBase
+from metrics_endpoint import MetricsEndpointProvider
+from nginx_config import (
+    ACCESS_LOG_FORMATS,
+    CA_CERT_PATH,
+    CERT_PATH,
+    EVENTS_PORT,
+    FULLCHAIN_PATH,
+    HEALTH_PATH,
+    INTERNAL_PORT,
+    KEY_PATH,
+    NGINX_CONFIG_PATH,
+    OCSP_RESPONSE_PATH,
+    SESSION_TICKET_KEY_PATHS,
+    TLS_PROFILES,
+    NginxConfigBuilder,
+)
+from ops.charm import ActionEvent, CharmBase, SecretRotateEvent
+from ops.framework import StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
-from ops.pebble import ChangeError, Error, Layer, PathError, ProtocolError
+from ops.model import ActiveStatus, BlockedStatus, StatusBase, WaitingStatus
+from ops.pebble import APIError, ChangeError, Error, Layer, PathError, ProtocolError
+from reconcile_metrics import CountingContainer, ReconcileMetrics
+from resource_patch import ResourcePatch, ResourcePatchError, quantity, resource_limits
+from restart_lock import RestartLock
+from search_index import SearchIndexBuilder
+from session_tickets import SECRET_LABEL as SESSION_TICKET_KEYS_LABEL
+from session_tickets import SessionTicketKeys
+from shards import SHARDS_DIR, CatalogueShards, digest, shard_path
+
+if TYPE_CHECKING:
+    from opentelemetry.trace import Span
 
 logger = logging.getLogger(__name__)
 
 ROOT_PATH = "/web"
 CONFIG_PATH = ROOT_PATH + "/config.json"
+SEARCH_INDEX_PATH = ROOT_PATH + "/search-index.json"
+VERSION_PATH = ROOT_PATH + "/version.json"
+SHARDS_PATH = ROOT_PATH + "/" + SHARDS_DIR
+EVENTS_SERVICE = "catalogue-events"
+EXPORTER_SERVICE = "catalogue-exporter"
+EXPORTER_PORT = 9113
+TRACER_SERVICE = "catalogue-tracer"
+# Pebble checks probing nginx. Readiness, which Kubernetes and thus ingress
+# follow, is lost within seconds of nginx not answering, e.g. while restarting;
+# nginx is only restarted once it stopped answering for a while.
+READY_CHECK = "catalogue-ready"
+ALIVE_CHECK = "catalogue-alive"
+HEALTH_URL = f"http://127.0.0.1:{INTERNAL_PORT}{HEALTH_PATH}"
+# When stopped, e.g. on restart, upgrade or pod eviction, nginx first fails its
+# health check for this many seconds, long enough for the unit to lose
+# readiness, then finishes the requests in flight within the kill delay. Long
+# lived connections, e.g. to the events stream, are closed after the worker
+# shutdown timeout, so that nginx is gone before Pebble would kill it.
+DRAIN_DELAY = 10
+WORKER_SHUTDOWN_TIMEOUT = "15s"
+KILL_DELAY = "30s"
+# Memory budgeted for each nginx connection, including its TLS state, when
+# sizing worker_connections to the memory limit.
+CONNECTION_MEMORY = 64 * 1024
+MIN_WORKER_CONNECTIONS = 512
+MAX_WORKER_CONNECTIONS = 16384
+# Picked up by the exporter along with the nginx metrics.
+RECONCILE_METRICS_PATH = "/var/lib/catalogue-exporter/reconcile.prom"
+# How long after switching between HTTP and HTTPS both listeners keep serving
+# content, giving ingress time to pick up the new scheme and port.
+TRANSITION_GRACE_PERIOD = 300
 
 
 @trace_charm(
@@ -45,26 +107,47 @@ CONFIG_PATH = ROOT_PATH + "/config.json"
         CertHandler,
         IngressPerAppRequirer,
     ),
+    sampling_policy="tracing_sampling_policy",
 )
 class CatalogueCharm(CharmBase):
     """Catalogue charm class."""
 
     _ca_path = "/usr/local/share/ca-certificates/ca.crt"
+    _stored = StoredState()
 
     def __init__(self, *args):
         super().__init__(*args)
         self.name = "catalogue"  # container, layer, service
-
-        self.unit.set_ports(80)
+        self._reconcile_metrics = ReconcileMetrics()
+        # The main workload of the charm, counting the Pebble calls made through it.
+        self.workload = CountingContainer(
+            self.unit.get_container(self.name), self._reconcile_metrics
+        )
+        self._stored.set_default(
+            scheme="http",
+            scheme_changed_at=0.0,
+            transition_pending=False,
+            pending_restarts="[]",
+            draining_certs=False,
+            resource_limits="{}",
+            resource_patch_error="",
+        )
 
         self._tracing = TracingEndpointRequirer(self, protocols=["otlp_http"])
 
         self._info = CatalogueProvider(charm=self)
+        self._resource_patch = ResourcePatch(self, self.name)
+        self._session_tickets = SessionTicketKeys(self, "replicas")
+        self._catalogue_sync = CatalogueSync(self, "replicas")
+        self._restart_lock = RestartLock(
+            self, "replicas", max_units=cast(int, self.config.get("max-restarting-units", 1))
+        )
 
         self.server_cert = CertHandler(
             self,
             key="catalogue-server-cert",
             sans=[socket.getfqdn()],
+            key_algorithm="ecdsa-p256",
         )
         self._ingress = IngressPerAppRequirer(
             charm=self,
@@ -72,6 +155,16 @@ class CatalogueCharm(CharmBase):
             strip_prefix=True,
             scheme=lambda: urlparse(self._internal_url).scheme,
         )
+        self._metrics_endpoint = MetricsEndpointProvider(
+            self,
+            jobs=[{"static_configs": [{"targets": [f"*:{EXPORTER_PORT}"]}]}],
+            refresh_event=[
+                self.on.config_changed,
+                self.server_cert.on.cert_changed,  # pyright: ignore
+                self._ingress.on.ready,  # pyright: ignore
+                self._ingress.on.revoked,  # pyright: ignore
+            ],
+        )
         self.framework.observe(
             self.on.catalogue_pebble_ready, self._on_catalogue_pebble_ready  # pyright: ignore
         )
@@ -80,6 +173,7 @@ class CatalogueCharm(CharmBase):
         )
         self.framework.observe(self.on.upgrade_charm, self._on_upgrade)
         self.framework.observe(self.on.config_changed, self._on_config_changed)
+        self.framework.observe(self.on.update_status, self._on_update_status)
         self.framework.observe(self._ingress.on.ready, self._on_ingress_ready)  # pyright: ignore
         self.framework.observe(
             self._ingress.on.revoked, self._on_ingress_revoked  # pyright: ignore
@@ -89,6 +183,22 @@ class CatalogueCharm(CharmBase):
             self._on_server_cert_changed,
         )
         self.framework.observe(self.on.get_url_action, self._get_url)
+        self.framework.observe(self.on.leader_elected, self._on_leader_elected)
+        self.framework.observe(self.on.replicas_relation_changed, self._on_replicas_changed)
+        self.framework.observe(self.on.replicas_relation_departed, self._on_replicas_changed)
+        self.framework.observe(self.on.secret_rotate, self._on_secret_rotate)
+        self.framework.observe(
+            self.on.metrics_endpoint_relation_created, self._on_metrics_endpoint_changed
+        )
+        self.framework.observe(
+            self.on.metrics_endpoint_relation_broken, self._on_metrics_endpoint_changed
+        )
+        self.framework.observe(
+            self._tracing.on.endpoint_changed, self._on_tracing_endpoint_changed  # pyright: ignore
+        )
+        self.framework.observe(
+            self._tracing.on.endpoint_removed, self._on_tracing_endpoint_changed  # pyright: ignore
+        )
 
     def _get_url(self, event: ActionEvent):
         """Return the external hostname to be passed to ingress via the relation.
@@ -131,11 +241,74 @@ class CatalogueCharm(CharmBase):
         self._configure(self.items)
 
     def _on_config_changed(self, _):
+        self._patch_resources()
         self._configure(self.items)
 
+    def _patch_resources(self):
+        """Apply the cpu and memory limits to the pod, as the leader.
+
+        A failure is kept, and reported in the status, until a patch succeeds.
+        """
+        if not self.unit.is_leader():
+            return
+        try:
+            limits = resource_limits(*self._resource_quantities)
+        except ValueError:
+            # Reported by _configure.
+            return
+        if json.dumps(limits, sort_keys=True) == self._stored.resource_limits:
+            return
+
+        try:
+            self._resource_patch.apply(limits)
+        except ResourcePatchError as e:
+            self._stored.resource_patch_error = f"{e}; is the application trusted?"
+            logger.error(str(e))
+            return
+        self._stored.resource_limits = json.dumps(limits, sort_keys=True)
+        self._stored.resource_patch_error = ""
+
+    def _on_update_status(self, _):
+        if self._stored.resource_patch_error:
+            # The application may have been trusted since: try again.
+            self._patch_resources()
+            self._configure(self.items)
+        elif self._stored.transition_pending and not self._in_transition:
+            # Ingress has had time to follow the last change of scheme: wrap it up.
+            self._configure(self.items)
+        elif self.workload.can_connect() and self._update_ocsp_response():
+            # Otherwise, only the OCSP staple may need refreshing, once it is about to expire.
+            self._configure(self.items, ocsp_changed=True)
+
     def _on_items_changed(self, event: CatalogueItemsChangedEvent):
         self._configure(event.items)
 
+    def _on_leader_elected(self, _):
+        self._session_tickets.ensure()
+        self._configure(self.items)
+
+    def _on_replicas_changed(self, _):
+        # Units may be waiting for, or done with, the restart lock.
+        self._restart_lock.grant()
+        # The leader may have generated or rotated the session ticket keys, published new
+        # catalogue entries, or granted this unit the restart lock; other units may have
+        # caught up with the catalogue.
+        self._configure(self.items)
+
+    def _on_metrics_endpoint_changed(self, _):
+        # The stub_status page and the exporter only run while something scrapes them.
+        self._configure(self.items)
+
+    def _on_tracing_endpoint_changed(self, _):
+        # Request spans are sent to the same endpoint as the charm's.
+        self._configure(self.items)
+
+    def _on_secret_rotate(self, event: SecretRotateEvent):
+        if event.secret.label != SESSION_TICKET_KEYS_LABEL:
+            return
+        self._session_tickets.rotate(event.secret)
+        self._configure(self.items)
+
     def _on_server_cert_changed(self, _):
         self._configure(self.items, push_certs=True)
 
@@ -145,8 +318,18 @@ class CatalogueCharm(CharmBase):
         self._ingress.provide_ingress_requirements(scheme=parsed.scheme, port=port)
 
     def _push_certs(self):
-        for path in [KEY_PATH, CERT_PATH, CA_CERT_PATH]:
-            self.workload.remove_path(path, recursive=True)
+        if (
+            not self.server_cert.server_cert
+            and self._stored.scheme == "https"
+            and self.workload.exists(CERT_PATH)
+        ):
+            # Keep serving HTTPS with the old cert until ingress moved back to HTTP.
+            logger.info("Server cert gone, keeping HTTPS up for the transition")
+            self._stored.draining_certs = True
+            return
+
+        self._stored.draining_certs = False
+        self._remove_certs()
 
         if self.server_cert.ca_cert:
             self.workload.push(CA_CERT_PATH, self.server_cert.ca_cert, make_dirs=True)
@@ -154,70 +337,424 @@ class CatalogueCharm(CharmBase):
             ca_cert_path = Path(self._ca_path)
             ca_cert_path.parent.mkdir(exist_ok=True, parents=True)
             ca_cert_path.write_text(self.server_cert.ca_cert)
-            subprocess.check_output(["update-ca-certificates", "--fresh"])
+            with self._reconcile_metrics.phase("update_ca_certificates"):
+                subprocess.check_output(["update-ca-certificates", "--fresh"])
 
         if self.server_cert.server_cert:
             self.workload.push(CERT_PATH, self.server_cert.server_cert, make_dirs=True)
+            if chain := self.server_cert.chain:
+                self.workload.push(FULLCHAIN_PATH, chain, make_dirs=True)
 
         if self.server_cert.private_key:
             self.workload.push(KEY_PATH, self.server_cert.private_key, make_dirs=True)
 
-    def _configure(self, items, push_certs: bool = False):
+    def _remove_certs(self):
+        for path in [KEY_PATH, CERT_PATH, FULLCHAIN_PATH, CA_CERT_PATH]:
+            self.workload.remove_path(path, recursive=True)
+
+    def _track_scheme(self):
+        """Record when the scheme published to ingress last changed, and wrap up transitions."""
+        scheme = urlparse(self._internal_url).scheme
+        if scheme != self._stored.scheme:
+            self._stored.scheme = scheme
+            self._stored.scheme_changed_at = time.time()
+            self._stored.transition_pending = True
+
+        if self._in_transition:
+            return
+        self._stored.transition_pending = False
+        # The old cert is only kept around for the transition away from HTTPS.
+        if self._stored.draining_certs:
+            self._remove_certs()
+            self._stored.draining_certs = False
+
+    @property
+    def _http_redirect(self) -> bool:
+        """Whether port 80 only redirects to HTTPS, once ingress has had time to switch to it."""
+        return (
+            bool(self.model.config.get("http-redirect", False))
+            and self._stored.scheme == "https"
+            and not self._in_transition
+        )
+
+    @property
+    def _http_listener(self) -> bool:
+        """Whether nginx listens on port 80.
+
+        Without TLS, always. With TLS, only while ingress may still be using plain HTTP,
+        or to redirect to HTTPS.
+        """
+        return (
+            not self._serves_tls()
+            or self._stored.scheme != "https"
+            or self._in_transition
+            or self._http_redirect
+        )
+
+    @property
+    def _in_transition(self) -> bool:
+        """Whether ingress may still be routing to the listener used before the last change."""
+        return time.time() - self._stored.scheme_changed_at < TRANSITION_GRACE_PERIOD
+
+    def _configure(self, items, push_certs: bool = False, ocsp_changed: bool = False):
+        with self._reconcile_metrics.phase("total"):
+            self._reconcile(items, push_certs=push_certs, ocsp_changed=ocsp_changed)
+        self._publish_reconcile_metrics(get_current_span())
+
+    def _reconcile(self, items, push_certs: bool = False, ocsp_changed: bool = False):
+        items = self._catalogue_sync.converge(items)
         if not self.workload.can_connect():
             self._update_status(WaitingStatus("Waiting for Pebble ready"))
             return
 
+        if msg := self._config_error():
+            self._update_status(BlockedStatus(msg))
+            logger.error(msg)
+            return
+
+        metrics = self._reconcile_metrics
         if push_certs:
-            try:
-                self._push_certs()
-            except (ProtocolError, PathError, Exception) as e:
-                self._update_status(BlockedStatus(str(e)))
-                logger.error(str(e))
-                return
-
-        nginx_config_changed = self._update_web_server_config()
-        catalogue_config_changed = self._update_catalogue_config(items)
-        pebble_layer_changed = self._update_pebble_layer()
-        restart = any([nginx_config_changed, catalogue_config_changed, pebble_layer_changed])
-
-        if restart:
-            try:
-                self.workload.restart(self.name)
-            except ChangeError as e:
-                msg = f"Failed to restart Catalogue: {e}"
-                self._update_status(BlockedStatus(msg))
-                logger.error(msg)
-                return
+            with metrics.phase("push_certs"):
+                try:
+                    self._push_certs()
+                except (ProtocolError, PathError, Exception) as e:
+                    self._update_status(BlockedStatus(str(e)))
+                    logger.error(str(e))
+                    return
+
+        self._track_scheme()
+
+        if push_certs:
+            with metrics.phase("ocsp"):
+                ocsp_changed = self._update_ocsp_response(force=True) or ocsp_changed
+
+        with metrics.phase("session_tickets"):
+            self._session_tickets.ensure()
+            ticket_keys = self._session_tickets.keys if self._is_tls_ready() else []
+            ticket_keys_changed = self._update_session_ticket_keys(ticket_keys)
+        # Written before the nginx config, which carries the catalogue version as its ETag:
+        # the other way round, the previous catalogue could be cached under the new version.
+        with metrics.phase("catalogue_config"):
+            catalogue_config_changed = self._update_catalogue_config(items)
+        self._catalogue_sync.report(items)
+        with metrics.phase("nginx_config"):
+            nginx_config_changed = self._update_web_server_config(
+                SESSION_TICKET_KEY_PATHS[: len(ticket_keys)]
+            )
+        self.unit.set_ports(
+            *(port for port, on in ((80, self._http_listener), (443, self._serves_tls())) if on)
+        )
+        with metrics.phase("pebble_layer"):
+            restarts = self._update_pebble_layer()
+        # New certs, keys and config, including the ETag of a new catalogue, only take a
+        # reload, which nginx does without dropping connections.
+        reload = any([ocsp_changed, ticket_keys_changed, nginx_config_changed])
+
+        # The new catalogue is served as soon as it is written, restart or not.
+        if catalogue_config_changed and self._live_updates:
+            self._notify_catalogue_changed()
+
+        if not self._restart_or_reload(restarts, reload):
+            return
 
         if self.unit.is_leader():
-            self._update_status(ActiveStatus())
+            self._update_status(self._settled_status)
+
+    def _restart_or_reload(self, restarts: List[str], reload: bool) -> bool:
+        """Restart the services that need it, or have nginx reload what changed.
+
+        Returns:
+            False if the services are still to be restarted, once this unit gets the
+            restart lock, or failed to.
+        """
+        metrics = self._reconcile_metrics
+        restarted: List[str] = []
+        if restarts or self._restart_lock.pending:
+            with metrics.phase("restart"):
+                restarted = self._restart(restarts)
+            if not restarted:
+                return False
+        if reload and self.name not in restarted:
+            with metrics.phase("reload"):
+                self._reload()
+        return True
 
-    def _update_pebble_layer(self) -> bool:
+    @property
+    def _settled_status(self) -> StatusBase:
+        if self._stored.resource_patch_error:
+            return BlockedStatus(self._stored.resource_patch_error)
+        if lagging := self._catalogue_sync.lagging_units:
+            return ActiveStatus(f"Not serving the latest catalogue yet: {', '.join(lagging)}")
+        return ActiveStatus()
+
+    def _reload(self):
+        """Have nginx load its new config, certs and keys, with new workers."""
+        if not self.workload.get_service(self.name).is_running():
+            self.workload.start(self.name)
+            return
+        try:
+            # Forwarded to nginx by the catalogue-nginx wrapper.
+            self.workload.send_signal("SIGHUP", self.name)
+        except APIError as e:
+            logger.error("Failed to reload %s: %s", self.name, e)
+
+    def _restart(self, services: List[str]) -> List[str]:
+        """Restart the services, and any left to restart, once few enough other units do.
+
+        Returns:
+            The services restarted, none if they could not be yet: they will be when the
+            leader grants this unit the restart lock.
+        """
+        pending = json.loads(self._stored.pending_restarts)
+        # A request for the lock from before services were tracked was for nginx.
+        services = sorted(set(services).union(pending)) or [self.name]
+        if not self._restart_lock.acquire():
+            self._stored.pending_restarts = json.dumps(services)
+            logger.info("Waiting for other units to restart before restarting")
+            self._update_status(WaitingStatus("Waiting for other units to restart"))
+            return []
+
+        try:
+            self.workload.restart(*services)
+        except ChangeError as e:
+            msg = f"Failed to restart Catalogue: {e}"
+            self._update_status(BlockedStatus(msg))
+            logger.error(msg)
+            return []
+        finally:
+            self._stored.pending_restarts = "[]"
+            self._restart_lock.release()
+        return services
+
+    def _config_error(self) -> Optional[str]:
+        """Why the web server cannot be configured as set through `juju config`, if it can't."""
+        config = self.model.config
+        tls_profile = cast(str, config.get("tls-profile", "modern"))
+        if tls_profile not in TLS_PROFILES:
+            return (
+                f"Invalid tls-profile: {tls_profile!r}; must be one of {', '.join(TLS_PROFILES)}"
+            )
+        access_log = cast(str, config.get("access-log", "combined"))
+        if access_log not in ACCESS_LOG_FORMATS:
+            return (
+                f"Invalid access-log: {access_log!r}; "
+                f"must be one of {', '.join(ACCESS_LOG_FORMATS)}"
+            )
+        if not re.fullmatch(r"(\d+[km]?)?", cast(str, config.get("access-log-buffer", ""))):
+            return "Invalid access-log-buffer: must be a size, e.g. 64k"
+        if not re.fullmatch(r"(\d+(ms|s|m|h)?)?", cast(str, config.get("access-log-flush", ""))):
+            return "Invalid access-log-flush: must be a duration, e.g. 5s"
+        if not 0.0001 <= cast(float, config.get("access-log-sample-rate", 1.0)) <= 1:
+            return "Invalid access-log-sample-rate: must be between 0.0001 and 1"
+        if not 0 <= cast(float, config.get("tracing-sample-rate", 1.0)) <= 1:
+            return "Invalid tracing-sample-rate: must be between 0 and 1"
+        if cast(float, config.get("tracing-slow-dispatch", 10.0)) < 0:
+            return "Invalid tracing-slow-dispatch: must not be negative"
+        try:
+            resource_limits(*self._resource_quantities)
+        except ValueError as e:
+            return str(e)
+        return None
+
+    def _publish_reconcile_metrics(self, span: Optional["Span"]):
+        """Attach the reconcile metrics to the reconcile's span, and hand them to the exporter."""
+        metrics = self._reconcile_metrics
+        if span:
+            span.set_attributes(metrics.span_attributes())
+        if not self._metrics:
+            return
+
+        try:
+            # Not through self.workload: this push is not part of the reconcile.
+            self.unit.get_container(self.name).push(
+                RECONCILE_METRICS_PATH, metrics.render(time.time()), make_dirs=True
+            )
+        except Error as e:
+            logger.warning("Failed to write reconcile metrics: %s", e)
+
+    def _notify_catalogue_changed(self):
+        """Have the events service announce the new catalogue to open pages."""
+        try:
+            self.workload.send_signal("SIGHUP", EVENTS_SERVICE)
+        except APIError as e:
+            # The service reads the current version when it starts anyway.
+            logger.warning("Failed to notify %s: %s", EVENTS_SERVICE, e)
+
+    def _update_pebble_layer(self) -> List[str]:
+        """Update the layer, returning the services that must restart for it to apply.
+
+        Services that are new are started, and the ones no longer enabled stopped, right away.
+        """
         current_layer = self.workload.get_plan()
+        planned = set(current_layer.services)
+        layer = self._pebble_layer(planned)
 
-        if current_layer.services == self._pebble_layer.services:
-            return False
+        if current_layer.services == layer.services and current_layer.checks == layer.checks:
+            return []
 
-        self.workload.add_layer(self.name, self._pebble_layer, combine=True)
+        self.workload.add_layer(self.name, layer, combine=True)
         self.workload.autostart()
-        return True
+        restarts = []
+        for name, (_, _, enabled, _) in self._optional_services.items():
+            if name in planned and not enabled:
+                self.workload.stop(name)
+            elif name in planned and current_layer.services[name] != layer.services[name]:
+                # e.g. a new endpoint in its environment.
+                restarts.append(name)
+        if self.name in planned and current_layer.services[self.name] != layer.services[self.name]:
+            restarts.append(self.name)
+        return restarts
 
     def _update_catalogue_config(self, items) -> bool:
-        config = {**self.charm_config, "apps": items}
+        page_size = cast(int, self.model.config.get("page-size", 0))
+        if page_size > 0:
+            shards = CatalogueShards(items, page_size)
+            config = shards.manifest(self.charm_config)
+        else:
+            shards = None
+            config = {**self.charm_config, "apps": items}
 
-        if self._running_catalogue_config == config:
+        running_config = self._running_catalogue_config
+        if running_config == config:
+            if not all(self.workload.exists(p) for p in (SEARCH_INDEX_PATH, VERSION_PATH)):
+                self._update_search_index(items)
+                self._update_version(config)
             return False
 
+        if shards:
+            self._update_shards(shards, running_config.get("pages", []))
+        elif self.workload.exists(SHARDS_PATH):
+            self.workload.remove_path(SHARDS_PATH, recursive=True)
+
         self.workload.push(
             CONFIG_PATH,
-            json.dumps({**self.charm_config, "apps": items}),
+            json.dumps(config),
             make_dirs=True,
         )
+        self._update_search_index(items)
+        self._update_version(config)
         logger.info("Configuring %s application entries", len(items))
         return True
 
-    def _update_web_server_config(self) -> bool:
-        config = NginxConfigBuilder(self._is_tls_ready()).build()
+    def _update_version(self, config: dict):
+        """Write the version file the UI polls to detect catalogue changes.
+
+        It is written last, so that by the time the version changes, the
+        config, shards and search index it refers to are all in place.
+        """
+        self.workload.push(
+            VERSION_PATH,
+            json.dumps({"version": digest(config)}),
+            make_dirs=True,
+        )
+
+    def _update_shards(self, shards: CatalogueShards, running_pages: list):
+        """Write the shards whose content changed and remove the ones no longer needed."""
+        pages = shards.pages
+        running_digests = [page.get("digest") for page in running_pages]
+        for number, page in enumerate(pages):
+            if number < len(running_digests) and running_digests[number] == digest(page):
+                continue
+            self.workload.push(
+                f"{ROOT_PATH}/{shard_path(number)}",
+                json.dumps(page),
+                make_dirs=True,
+            )
+        for number in range(len(pages), len(running_pages)):
+            self.workload.remove_path(f"{ROOT_PATH}/{shard_path(number)}")
+
+    def _update_search_index(self, items):
+        """Write the search index for the entries in config.json next to it."""
+        index = SearchIndexBuilder(items).build()
+        self.workload.push(
+            SEARCH_INDEX_PATH,
+            json.dumps(index, separators=(",", ":")),
+            make_dirs=True,
+        )
+
+    def _update_session_ticket_keys(self, keys: List[bytes]) -> bool:
+        """Push the shared session ticket keys, current one first, into the workload.
+
+        nginx reads the keys when it (re)loads its configuration, so a change only needs a
+        reload: the new workers pick the keys up while the old ones finish their connections.
+        """
+        changed = False
+        for path, key in zip(SESSION_TICKET_KEY_PATHS, keys):
+            if self._running_file(path) != key:
+                self.workload.push(path, key, make_dirs=True)
+                changed = True
+        for path in SESSION_TICKET_KEY_PATHS[len(keys) :]:
+            if self.workload.exists(path):
+                self.workload.remove_path(path)
+                changed = True
+        return changed
+
+    def _update_ocsp_response(self, force: bool = False) -> bool:
+        """Fetch a fresh OCSP response for the server certificate, for nginx to staple.
+
+        Unless forced, e.g. because the certificate changed, the response in the workload is
+        only replaced when it is about to expire, and kept until it has if the responder
+        cannot be reached. nginx reads it when it (re)loads its configuration, so a change
+        only needs a reload.
+        """
+        # Imported here, as cryptography's OCSP support is only needed with TLS on.
+        from ocsp import OCSPFetchError, fetch_ocsp_response, ocsp_response_expiring
+
+        cert = self.server_cert.server_cert if self._is_tls_ready() else None
+        current = self._running_file(OCSP_RESPONSE_PATH)
+        if cert and current and not force and not ocsp_response_expiring(current):
+            return False
+
+        response = None
+        if cert:
+            issuers = [pem for pem in (self.server_cert.chain, self.server_cert.ca_cert) if pem]
+            try:
+                response = fetch_ocsp_response(cert, issuers)
+            except OCSPFetchError as e:
+                logger.warning(str(e))
+                if current and not force and not ocsp_response_expiring(current, timedelta(0)):
+                    return False
+        if response is None:
+            if current is None:
+                return False
+            self.workload.remove_path(OCSP_RESPONSE_PATH)
+            return True
+        if response == current:
+            return False
+
+        self.workload.push(OCSP_RESPONSE_PATH, response, make_dirs=True)
+        return True
+
+    def _running_file(self, path: str) -> Optional[bytes]:
+        """Get the contents of a file in the workload, if it exists."""
+        try:
+            return cast(bytes, self.workload.pull(path, encoding=None).read())
+        except (FileNotFoundError, Error):
+            return None
+
+    def _update_web_server_config(self, ticket_key_paths: Sequence[str] = ()) -> bool:
+        tls = self._serves_tls()
+        config = NginxConfigBuilder(
+            tls,
+            events=self._live_updates,
+            tls_profile=cast(str, self.model.config.get("tls-profile", "modern")),
+            session_ticket_keys=ticket_key_paths,
+            fullchain=tls and self.workload.exists(FULLCHAIN_PATH),
+            ocsp_stapling=tls and self.workload.exists(OCSP_RESPONSE_PATH),
+            http_redirect=self._http_redirect,
+            http_listener=self._http_listener,
+            metrics=self._metrics,
+            access_log_format=cast(str, self.model.config.get("access-log", "combined")),
+            access_log_buffer=cast(str, self.model.config.get("access-log-buffer", "")),
+            access_log_flush=cast(str, self.model.config.get("access-log-flush", "")),
+            access_log_sample_rate=cast(
+                float, self.model.config.get("access-log-sample-rate", 1.0)
+            ),
+            request_tracing=self._request_tracing,
+            worker_shutdown_timeout=WORKER_SHUTDOWN_TIMEOUT,
+            catalogue_version=self._catalogue_version,
+            **self._worker_sizing,
+        ).build()
 
         if self._running_nginx_config == config:
             return False
@@ -238,6 +775,14 @@ class CatalogueCharm(CharmBase):
             logger.error("Failed to retrieve Nginx config %s", e)
             return ""
 
+    @property
+    def _catalogue_version(self) -> str:
+        """The version of the catalogue on disk, empty if none was written yet."""
+        try:
+            return json.loads(self.workload.pull(VERSION_PATH).read())["version"]
+        except (FileNotFoundError, Error, ValueError, KeyError):
+            return ""
+
     @property
     def _running_catalogue_config(self) -> dict:
         """Get the on-disk Catalogue config."""
@@ -251,18 +796,107 @@ class CatalogueCharm(CharmBase):
             return {}
 
     @property
-    def _pebble_layer(self) -> Layer:
+    def _optional_services(self) -> Dict[str, Tuple[str, str, bool, Dict[str, str]]]:
+        """Summary, command, whether it should run and environment, of the services next to nginx."""
+        return {
+            EVENTS_SERVICE: (
+                "catalogue events",
+                f"catalogue-events {EVENTS_PORT}",
+                self._live_updates,
+                {},
+            ),
+            EXPORTER_SERVICE: (
+                "catalogue metrics exporter",
+                f"catalogue-exporter {EXPORTER_PORT}",
+                self._metrics,
+                {},
+            ),
+            TRACER_SERVICE: (
+                "catalogue request tracer",
+                "catalogue-tracer",
+                self._request_tracing,
+                self._tracer_environment,
+            ),
+        }
+
+    @property
+    def _tracer_environment(self) -> Dict[str, str]:
+        """Where the tracer sends request spans, and the resource they come from.
+
+        The resource has the same Juju topology as the charm traces, so that
+        request latency shows up next to the reconcile passes.
+        """
+        endpoint = self.tracing_endpoint
+        if not endpoint:
+            return {}
+        environment = {
+            "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT": f"{endpoint}/v1/traces",
+            "OTEL_SERVICE_NAME": self.app.name,
+            "OTEL_RESOURCE_ATTRIBUTES": ",".join(
+                [
+                    f"juju_unit={self.unit.name}",
+                    f"juju_application={self.app.name}",
+                    f"juju_model={self.model.name}",
+                    f"juju_model_uuid={self.model.uuid}",
+                ]
+            ),
+        }
+        if endpoint.startswith("https://") and self._is_tls_ready():
+            environment["OTEL_EXPORTER_OTLP_TRACES_CERTIFICATE"] = CA_CERT_PATH
+        return environment
+
+    def _pebble_layer(self, planned: Collection[str] = ()) -> Layer:
+        """The pebble layer for the catalogue.
+
+        Args:
+            planned: the services already in the plan. Services can't be removed from
+                the plan, so once an optional service is no longer needed it is kept in
+                the layer, disabled.
+        """
+        services = {
+            self.name: {
+                "override": "replace",
+                "summary": "catalogue",
+                "command": f"catalogue-nginx -c {NGINX_CONFIG_PATH}",
+                "startup": "enabled",
+                "environment": {"CATALOGUE_DRAIN_DELAY": str(DRAIN_DELAY)},
+                "kill-delay": KILL_DELAY,
+                "on-check-failure": {ALIVE_CHECK: "restart"},
+            }
+        }
+        for name, (summary, command, enabled, environment) in self._optional_services.items():
+            if enabled or name in planned:
+                services[name] = {
+                    "override": "replace",
+                    "summary": summary,
+                    "command": command,
+                    "startup": "enabled" if enabled else "disabled",
+                }
+                if environment:
+                    services[name]["environment"] = environment
+
         return Layer(
             {
                 "summary": "catalogue layer",
                 "description": "pebble config layer for the catalogue",
-                "services": {
-                    self.name: {
+                "services": services,
+                "checks": {
+                    READY_CHECK: {
+                        "override": "replace",
+                        "level": "ready",
+                        "period": "2s",
+                        "timeout": "1s",
+                        "threshold": 2,
+                        "http": {"url": HEALTH_URL},
+                    },
+                    ALIVE_CHECK: {
                         "override": "replace",
-                        "summary": "catalogue",
-                        "command": f"nginx -g 'daemon off;' -c {NGINX_CONFIG_PATH}",
-                        "startup": "enabled",
-                    }
+                        "level": "alive",
+                        "period": "10s",
+                        "timeout": "3s",
+                        "threshold": 3,
+                        "http": {"url": HEALTH_URL},
+                    },
                 },
             }
         )
@@ -274,11 +908,6 @@ class CatalogueCharm(CharmBase):
             return []
         return self._info.items
 
-    @property
-    def workload(self):
-        """The main workload of the charm."""
-        return self.unit.get_container(self.name)
-
     @property
     def charm_config(self):
         """The part of the charm config that is set through `juju config`."""
@@ -287,8 +916,52 @@ class CatalogueCharm(CharmBase):
             "tagline": self.model.config["tagline"],
             "description": self.model.config.get("description", ""),
             "links": json.loads(cast(str, self.model.config["links"])),
+            "live_updates": self._live_updates,
         }
 
+    @property
+    def _live_updates(self) -> bool:
+        """Whether open pages are pushed catalogue changes by the events service."""
+        return bool(self.model.config.get("live-updates", False))
+
+    @property
+    def _resource_quantities(self) -> Tuple[str, str]:
+        """The cpu and memory limits set through `juju config`, empty if unset."""
+        return (
+            cast(str, self.model.config.get("cpu", "")),
+            cast(str, self.model.config.get("memory", "")),
+        )
+
+    @property
+    def _worker_sizing(self) -> Dict[str, int]:
+        """Workers for nginx to run, and connections per worker, fitting the resource limits.
+
+        A worker per CPU, and as many connections as fit in the memory limit, shared
+        among the workers.
+        """
+        try:
+            limits = resource_limits(*self._resource_quantities)
+        except ValueError:
+            limits = {}
+        processes = 1
+        if "cpu" in limits:
+            processes = max(1, math.ceil(quantity(limits["cpu"])))
+        connections = 1024
+        if "memory" in limits:
+            budget = int(quantity(limits["memory"])) // processes // CONNECTION_MEMORY
+            connections = min(max(budget, MIN_WORKER_CONNECTIONS), MAX_WORKER_CONNECTIONS)
+        return {"worker_processes": processes, "worker_connections": connections}
+
+    @property
+    def _request_tracing(self) -> bool:
+        """Whether nginx requests are traced, which needs a tracing endpoint."""
+        return bool(self.model.config.get("request-tracing", False) and self.tracing_endpoint)
+
+    @property
+    def _metrics(self) -> bool:
+        """Whether nginx metrics are exported, which they are while something scrapes them."""
+        return bool(self.model.relations["metrics-endpoint"])
+
     def _is_tls_ready(self) -> bool:
         """Returns True if the workload is ready to operate in TLS mode."""
         return (
@@ -297,8 +970,13 @@ class CatalogueCharm(CharmBase):
             and self.workload.exists(CERT_PATH)
             and self.workload.exists(KEY_PATH)
             and self.workload.exists(CA_CERT_PATH)
+            and not self._stored.draining_certs
         )
 
+    def _serves_tls(self) -> bool:
+        """Whether nginx listens on 443, which it keeps doing for a while after losing TLS."""
+        return self._is_tls_ready() or self._stored.draining_certs
+
     @property
     def _internal_url(self) -> str:
         """Return the fqdn dns-based in-cluster (private) address of the catalogue server."""
@@ -319,6 +997,23 @@ class CatalogueCharm(CharmBase):
             return self._tracing.get_endpoint("otlp_http")
         return None
 
+    @property
+    def tracing_sampling_policy(self) -> SamplingPolicy:
+        """Which charm methods are traced, and which dispatches' traces are sent."""
+        config = self.model.config
+
+        def patterns(option: str) -> Tuple[str, ...]:
+            return tuple(
+                p.strip() for p in cast(str, config.get(option, "")).split(",") if p.strip()
+            )
+
+        return SamplingPolicy(
+            ratio=cast(float, config.get("tracing-sample-rate", 1.0)),
+            slow_dispatch=cast(float, config.get("tracing-slow-dispatch", 10.0)),
+            include=patterns("tracing-include") or ("*",),
+            exclude=patterns("tracing-exclude"),
+        )
+
     @property
     def server_ca_cert_path(self) -> Optional[str]:
         """Server CA certificate path for tls tracing."""
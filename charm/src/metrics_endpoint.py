@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Provider side of the prometheus_scrape interface.
+
+A subset of `charms.prometheus_k8s.v0.prometheus_scrape.MetricsEndpointProvider`,
+with the same constructor arguments, for the catalogue to use until that
+library is vendored: it is then a matter of changing the import.
+"""
+
+import copy
+import json
+import socket
+from typing import List, Optional, Union
+
+from ops.charm import CharmBase
+from ops.framework import BoundEvent, Object
+
+DEFAULT_JOB = {"metrics_path": "/metrics"}
+
+
+class MetricsEndpointProvider(Object):
+    """Advertise a metrics endpoint of each unit for Prometheus to scrape.
+
+    The leader publishes the scrape jobs in the application databag, with
+    wildcard targets, e.g. "*:9113", which Prometheus expands to the address
+    each unit publishes in its own databag. Everything is published again on
+    each of the refresh events, e.g. when the unit's address may have changed.
+    """
+
+    def __init__(
+        self,
+        charm: CharmBase,
+        relation_name: str = "metrics-endpoint",
+        jobs: Optional[List[dict]] = None,
+        refresh_event: Optional[Union[BoundEvent, List[BoundEvent]]] = None,
+    ):
+        super().__init__(charm, relation_name)
+        self._charm = charm
+        self._relation_name = relation_name
+        self._jobs = [{**DEFAULT_JOB, **job} for job in jobs or [{}]]
+
+        events = charm.on[relation_name]
+        self.framework.observe(events.relation_joined, self.set_scrape_job_spec)
+        self.framework.observe(events.relation_changed, self.set_scrape_job_spec)
+        self.framework.observe(charm.on.leader_elected, self.set_scrape_job_spec)
+        self.framework.observe(charm.on.upgrade_charm, self.set_scrape_job_spec)
+        if refresh_event is None:
+            refresh_event = []
+        elif not isinstance(refresh_event, list):
+            refresh_event = [refresh_event]
+        for event in refresh_event:
+            self.framework.observe(event, self.set_scrape_job_spec)
+
+    @property
+    def _scrape_metadata(self) -> dict:
+        model = self._charm.model
+        return {
+            "model": model.name,
+            "model_uuid": model.uuid,
+            "application": model.app.name,
+            "charm_name": self._charm.meta.name,
+            "unit": self._charm.unit.name,
+        }
+
+    def set_scrape_job_spec(self, _=None):
+        """Publish the scrape jobs, and this unit's address, on every relation."""
+        for relation in self._charm.model.relations[self._relation_name]:
+            relation.data[self._charm.unit].update(
+                {
+                    "prometheus_scrape_unit_address": socket.getfqdn(),
+                    "prometheus_scrape_unit_name": self._charm.unit.name,
+                }
+            )
+            if self._charm.unit.is_leader():
+                relation.data[self._charm.app].update(
+                    {
+                        "scrape_metadata": json.dumps(self._scrape_metadata),
+                        "scrape_jobs": json.dumps(copy.deepcopy(self._jobs)),
+                        "alert_rules": json.dumps({}),
+                    }
+                )
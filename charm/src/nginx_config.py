@@ -5,75 +5,368 @@
 
 import os
 from textwrap import dedent
+from typing import Sequence
 
 NGINX_CONFIG_PATH = "/etc/nginx/nginx.conf"
+# Read by the workload services rotating the logs nginx writes for them, to
+# have it reopen them.
+NGINX_PID_PATH = "/run/nginx.pid"
 CATALOGUE_CERTS_DIR = "/etc/catalogue/certs"
 CERT_PATH = os.path.join(CATALOGUE_CERTS_DIR, "catalogue.cert.pem")
 KEY_PATH = os.path.join(CATALOGUE_CERTS_DIR, "catalogue.key.pem")
 CA_CERT_PATH = os.path.join(CATALOGUE_CERTS_DIR, "ca.cert")
+# The server certificate followed by its intermediates, served to clients so
+# they need no extra round-trips to build the chain.
+FULLCHAIN_PATH = os.path.join(CATALOGUE_CERTS_DIR, "catalogue.fullchain.pem")
+OCSP_RESPONSE_PATH = os.path.join(CATALOGUE_CERTS_DIR, "ocsp.der")
+# Session ticket keys shared across units: the first one encrypts new tickets,
+# the others only decrypt tickets issued before the last rotation.
+SESSION_TICKET_KEY_PATHS = [
+    os.path.join(CATALOGUE_CERTS_DIR, "ticket.key"),
+    os.path.join(CATALOGUE_CERTS_DIR, "ticket.previous.key"),
+]
 
-HTTP_SERVICE = """
-http {
-    include            mime.types;
-    default_type       application/octet-stream;
-    sendfile           on;
-    keepalive_timeout  65;
+# The catalogue data the UI polls for changes, and the service worker script,
+# are always revalidated, so that nginx answers with a 304 when the ETag still
+# matches. The ETags nginx makes up are derived from the files' mtimes, which
+# differ between units, as each writes the catalogue at its own time: the data
+# files, which change together, get the version of the catalogue as their ETag
+# instead, the same on every unit serving it. Shards are fetched with their
+# digest in the query string, so any given URL never changes content, and
+# needs no revalidation.
+CATALOGUE_LOCATIONS = """
+        location ~ ^/(config\\.json|version\\.json|search-index\\.json)$ {{
+            {validator}add_header       Cache-Control "no-cache";
+        }}
 
-    upstream self {
-      server localhost:80;
-    }
+        location = /sw.js {{
+            add_header       Cache-Control "no-cache";
+        }}
+
+        location /apps/ {{
+            etag             off;
+            add_header       Cache-Control "public, max-age=31536000, immutable";
+        }}
+"""
 
-    server {
+CATALOGUE_ETAG = """etag             off;
+            if ($http_if_none_match = '"{version}"') {{
+                return       304;
+            }}
+            add_header       ETag '"{version}"';
+            """
+
+# The plain HTTP server, alone when TLS is off. With TLS on it runs next to the
+# HTTPS one only during a transition, so that clients still pointed at port 80
+# (e.g. ingress, until it picks up the new scheme) are served throughout.
+HTTP_SERVER = """
+    server {{
         listen               80;
         server_name          localhost;
         root                 /web;
-
+        {locations}
         error_page           500 502 503 504  /50x.html;
-        location = /50x.html {
+        location = /50x.html {{
             root             /usr/share/nginx/html;
-        }
-    }
-}
+        }}
+    }}
 """
 
-HTTPS_SERVICE = f"""
+# Takes the place of the plain HTTP server once everything moved to HTTPS, if
+# port 80 is to stay open at all.
+HTTP_REDIRECT_SERVER = """
+    server {{
+        listen               80;
+        server_name          localhost;
+
+        location / {{
+            return           308 https://$host$request_uri;
+        }}
+    }}
+"""
+
+HTTP_SERVICE = """
+http {{
+    include            mime.types;
+    default_type       application/octet-stream;
+    sendfile           on;
+    keepalive_timeout  65;
+
+    upstream self {{
+      server localhost:80;
+    }}
+{access_log}{metrics}{request_tracing}{internal_server}{http_server}}}
+"""
+
+HTTPS_SERVICE = """
 http {{
     include             mime.types;
     default_type        application/octet-stream;
     sendfile            on;
     ssl_session_cache   shared:SSL:10m;
     ssl_session_timeout 10m;
-
+{access_log}{metrics}{request_tracing}{internal_server}
     server {{
-        listen               443 ssl;
+        listen               443 ssl http2;
         server_name          localhost;
         keepalive_timeout    70;
         root                 /web;
-        ssl_certificate      {CERT_PATH};
-        ssl_certificate_key  {KEY_PATH};
-        ssl_protocols        TLSv1 TLSv1.1 TLSv1.2 TLSv1.3;
-        ssl_ciphers          HIGH:!aNULL:!MD5;
-
+        ssl_certificate      {cert_path};
+        ssl_certificate_key  {key_path};
+        {tls_profile}{session_ticket_keys}{ocsp_stapling}
+        {locations}
         error_page           500 502 503 504  /50x.html;
         location = /50x.html {{
             root             /usr/share/nginx/html;
         }}
     }}
-}}
+{http_server}}}
+"""
+
+# TLS settings selectable through the `tls-profile` config option. "modern"
+# only accepts TLS 1.2 and 1.3 with forward-secret AEAD ciphers, preferring
+# ECDHE key exchange over the cheaper elliptic curves; "legacy" also accepts
+# TLS 1.0 and 1.1 for old clients.
+TLS_PROFILES = {
+    "modern": """
+        ssl_protocols              TLSv1.2 TLSv1.3;
+        ssl_ciphers                ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384:ECDHE-ECDSA-CHACHA20-POLY1305:ECDHE-RSA-CHACHA20-POLY1305;
+        ssl_prefer_server_ciphers  off;
+        ssl_ecdh_curve             X25519:prime256v1:secp384r1;
+        ssl_session_tickets        on;
+""",
+    "legacy": """
+        ssl_protocols        TLSv1 TLSv1.1 TLSv1.2 TLSv1.3;
+        ssl_ciphers          HIGH:!aNULL:!MD5;
+""",
+}
+
+OCSP_STAPLING = """
+        ssl_stapling               on;
+        ssl_stapling_file          {response_path};
+        ssl_stapling_verify        on;
+        ssl_trusted_certificate    {ca_path};
+"""
+
+# Server-sent events announcing catalogue changes, served by the
+# catalogue-events service in the workload. Responses are streamed, so they
+# must not be buffered, and connections stay open for as long as the page.
+EVENTS_PORT = 8081
+EVENTS_LOCATION = f"""
+        location = /events {{
+            proxy_pass           http://127.0.0.1:{EVENTS_PORT}/events;
+            proxy_http_version   1.1;
+            proxy_set_header     Connection "";
+            proxy_buffering      off;
+            proxy_cache          off;
+            proxy_read_timeout   1h;
+        }}
+"""
+
+# A server only reachable from inside the pod, with the health endpoint the
+# Pebble checks probe and, for the catalogue-exporter service, the
+# stub_status page. The health endpoint fails as soon as the workload starts
+# shutting down nginx, which it then gives time to lose readiness.
+INTERNAL_PORT = 8082
+HEALTH_PATH = "/healthz"
+DRAIN_MARKER_PATH = "/run/catalogue-draining"
+INTERNAL_SERVER = """
+    server {{
+        listen               127.0.0.1:{internal_port};
+        access_log           off;
+
+        location = {health_path} {{
+            if (-f {drain_marker_path}) {{
+                return       503;
+            }}
+            return           200;
+        }}
+{stub_status}    }}
+"""
+STUB_STATUS_LOCATION = """
+        location = /stub_status {
+            stub_status;
+        }
+"""
+
+# Also for the exporter, a log of the requests answered with a server error,
+# holding nothing but their status.
+SERVER_ERRORS_LOG_PATH = "/var/log/nginx/server-errors.log"
+METRICS = """
+    map $status $server_error {{
+        ~^5                  1;
+        default              0;
+    }}
+    log_format  status  '$status';
+    access_log  {server_errors_log_path} status if=$server_error;
+"""
+
+# For the catalogue-tracer service, which sends a span per request to the
+# tracing backend: a log of the requests with their timings, and the trace
+# context their caller passed on, if any. It is flushed often, so spans are
+# not held back for long.
+REQUEST_TRACES_LOG_PATH = "/var/log/nginx/request-traces.log"
+REQUEST_TRACING = """
+    log_format  traces  escape=json '{{"request_id":"$request_id","traceparent":"$http_traceparent",'
+                        '"msec":"$msec","request_time":"$request_time",'
+                        '"method":"$request_method","uri":"$request_uri","status":$status,'
+                        '"body_bytes_sent":$body_bytes_sent,"scheme":"$scheme","host":"$host",'
+                        '"server_port":$server_port,"user_agent":"$http_user_agent"}}';
+    access_log  {request_traces_log_path} traces buffer=32k flush=1s;
+"""
+
+ACCESS_LOG_PATH = "/var/log/nginx/access.log"
+# Formats selectable through the `access-log` config option: nginx's own
+# "combined", one JSON object per request with the request and upstream
+# timings, or no access log at all.
+ACCESS_LOG_FORMATS = ("combined", "json", "off")
+JSON_LOG_FORMAT = """
+    log_format  json  escape=json '{"time":"$time_iso8601","remote_addr":"$remote_addr",'
+                      '"method":"$request_method","uri":"$request_uri","status":$status,'
+                      '"body_bytes_sent":$body_bytes_sent,"request_time":$request_time,'
+                      '"upstream_connect_time":"$upstream_connect_time",'
+                      '"upstream_response_time":"$upstream_response_time",'
+                      '"http_referer":"$http_referer","http_user_agent":"$http_user_agent"}';
+"""
+# Only a share of the requests, picked at random, is logged.
+ACCESS_LOG_SAMPLING = """
+    split_clients $request_id $access_log_sampled {{
+        {percentage}%    1;
+        *                0;
+    }}
 """
 
 
 class NginxConfigBuilder:
     """Class."""
 
-    def __init__(self, tls: bool = False):
+    def __init__(
+        self,
+        tls: bool = False,
+        events: bool = False,
+        tls_profile: str = "modern",
+        session_ticket_keys: Sequence[str] = (),
+        fullchain: bool = False,
+        ocsp_stapling: bool = False,
+        http_redirect: bool = False,
+        http_listener: bool = True,
+        metrics: bool = False,
+        access_log_format: str = "combined",
+        access_log_buffer: str = "",
+        access_log_flush: str = "",
+        access_log_sample_rate: float = 1.0,
+        worker_processes: int = 1,
+        worker_connections: int = 1024,
+        request_tracing: bool = False,
+        worker_shutdown_timeout: str = "",
+        catalogue_version: str = "",
+    ):
+        if tls_profile not in TLS_PROFILES:
+            raise ValueError(f"Unknown TLS profile: {tls_profile}")
+        if access_log_format not in ACCESS_LOG_FORMATS:
+            raise ValueError(f"Unknown access log format: {access_log_format}")
         self._tls = tls
+        self._events = events
+        self._tls_profile = tls_profile
+        self._session_ticket_keys = session_ticket_keys
+        self._fullchain = fullchain
+        self._ocsp_stapling = ocsp_stapling
+        self._http_redirect = http_redirect
+        self._http_listener = http_listener
+        self._metrics = metrics
+        self._access_log_format = access_log_format
+        self._access_log_buffer = access_log_buffer
+        self._access_log_flush = access_log_flush
+        self._access_log_sample_rate = access_log_sample_rate
+        self._worker_processes = worker_processes
+        self._worker_connections = worker_connections
+        self._request_tracing = request_tracing
+        self._worker_shutdown_timeout = worker_shutdown_timeout
+        self._catalogue_version = catalogue_version
+
+    def _session_ticket_key_directives(self) -> str:
+        return "".join(
+            f"        ssl_session_ticket_key     {path};\n" for path in self._session_ticket_keys
+        )
+
+    def _locations(self) -> str:
+        # Until the catalogue is written, nginx's own ETags will do.
+        validator = (
+            CATALOGUE_ETAG.format(version=self._catalogue_version)
+            if self._catalogue_version
+            else ""
+        )
+        locations = CATALOGUE_LOCATIONS.format(validator=validator)
+        if self._events:
+            locations += EVENTS_LOCATION
+        return locations
+
+    def _http_server(self) -> str:
+        if not self._tls:
+            return HTTP_SERVER.format(locations=self._locations())
+        if not self._http_listener:
+            return ""
+        if self._http_redirect:
+            return HTTP_REDIRECT_SERVER.format()
+        return HTTP_SERVER.format(locations=self._locations())
+
+    def _access_log_directives(self) -> str:
+        if self._access_log_format == "off":
+            # Any other access_log at this level already turns off the default one.
+            return "" if self._metrics or self._request_tracing else "    access_log  off;\n"
+
+        directives = JSON_LOG_FORMAT if self._access_log_format == "json" else ""
+        params = ""
+        if self._access_log_buffer:
+            params += f" buffer={self._access_log_buffer}"
+        if self._access_log_flush:
+            params += f" flush={self._access_log_flush}"
+        # split_clients takes at most two decimals, e.g. 12.35%.
+        percentage = round(self._access_log_sample_rate * 100, 2)
+        if 0 < percentage < 100:
+            directives += ACCESS_LOG_SAMPLING.format(percentage=f"{percentage:g}")
+            params += " if=$access_log_sampled"
+        return (
+            directives + f"    access_log  {ACCESS_LOG_PATH} {self._access_log_format}{params};\n"
+        )
+
+    def _metrics_directives(self) -> str:
+        if not self._metrics:
+            return ""
+        return METRICS.format(server_errors_log_path=SERVER_ERRORS_LOG_PATH)
+
+    def _request_tracing_directives(self) -> str:
+        if not self._request_tracing:
+            return ""
+        return REQUEST_TRACING.format(request_traces_log_path=REQUEST_TRACES_LOG_PATH)
+
+    def _internal_server(self) -> str:
+        return INTERNAL_SERVER.format(
+            internal_port=INTERNAL_PORT,
+            health_path=HEALTH_PATH,
+            drain_marker_path=DRAIN_MARKER_PATH,
+            stub_status=STUB_STATUS_LOCATION if self._metrics else "",
+        )
+
+    def _ocsp_stapling_directives(self) -> str:
+        if not self._ocsp_stapling:
+            return ""
+        # The response is fetched by the charm, so nginx never has to reach the responder.
+        return OCSP_STAPLING.format(response_path=OCSP_RESPONSE_PATH, ca_path=CA_CERT_PATH)
 
     def _nginx_config(self, service: str) -> str:
+        # Gracefully stopping workers otherwise wait for every connection to close.
+        shutdown_timeout = (
+            f"worker_shutdown_timeout  {self._worker_shutdown_timeout};\n        "
+            if self._worker_shutdown_timeout
+            else ""
+        )
         return dedent(
-            f"""worker_processes  1;
-        events {{
-            worker_connections  1024;
+            f"""pid               {NGINX_PID_PATH};
+        worker_processes  {self._worker_processes};
+        worker_rlimit_nofile  {2 * self._worker_connections};
+        {shutdown_timeout}events {{
+            worker_connections  {self._worker_connections};
         }}
 
         {service}
@@ -83,6 +376,28 @@ class NginxConfigBuilder:
     def build(self):
         """Build Nginx config file."""
         if self._tls:
-            return self._nginx_config(HTTPS_SERVICE)
+            return self._nginx_config(
+                HTTPS_SERVICE.format(
+                    cert_path=FULLCHAIN_PATH if self._fullchain else CERT_PATH,
+                    key_path=KEY_PATH,
+                    tls_profile=TLS_PROFILES[self._tls_profile],
+                    session_ticket_keys=self._session_ticket_key_directives(),
+                    ocsp_stapling=self._ocsp_stapling_directives(),
+                    locations=self._locations(),
+                    http_server=self._http_server(),
+                    access_log=self._access_log_directives(),
+                    metrics=self._metrics_directives(),
+                    request_tracing=self._request_tracing_directives(),
+                    internal_server=self._internal_server(),
+                )
+            )
 
-        return self._nginx_config(HTTP_SERVICE)
+        return self._nginx_config(
+            HTTP_SERVICE.format(
+                http_server=self._http_server(),
+                access_log=self._access_log_directives(),
+                metrics=self._metrics_directives(),
+                request_tracing=self._request_tracing_directives(),
+                internal_server=self._internal_server(),
+            )
+        )
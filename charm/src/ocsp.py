@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""OCSP responses for stapling the catalogue server certificate."""
+
+import logging
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from urllib.error import URLError
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.x509 import ocsp
+from cryptography.x509.oid import AuthorityInformationAccessOID, ExtensionOID
+
+logger = logging.getLogger(__name__)
+
+# Responses are refreshed once they are this close to their next update.
+REFRESH_MARGIN = timedelta(days=1)
+TIMEOUT = 5
+
+
+class OCSPFetchError(Exception):
+    """Raised when the OCSP responder could not be reached, or gave no usable answer."""
+
+
+def _responder_url(cert: x509.Certificate) -> Optional[str]:
+    try:
+        access = cert.extensions.get_extension_for_oid(
+            ExtensionOID.AUTHORITY_INFORMATION_ACCESS
+        ).value
+    except x509.ExtensionNotFound:
+        return None
+    for description in access:
+        if description.access_method == AuthorityInformationAccessOID.OCSP:
+            return description.access_location.value
+    return None
+
+
+def _issuer(cert: x509.Certificate, candidates: List[str]) -> Optional[x509.Certificate]:
+    for pem in candidates:
+        for candidate in x509.load_pem_x509_certificates(pem.encode()):
+            if candidate.subject == cert.issuer:
+                return candidate
+    return None
+
+
+def fetch_ocsp_response(cert_pem: str, issuer_pems: List[str]) -> Optional[bytes]:
+    """Fetch a DER-encoded OCSP response vouching for the certificate.
+
+    Args:
+        cert_pem: the certificate to staple a response for.
+        issuer_pems: PEM bundles (chain, CA) in which to look for its issuer.
+
+    Returns:
+        The response, or None if the certificate names no OCSP responder, or the
+        responder reports the certificate as anything but good.
+
+    Raises:
+        OCSPFetchError: if the responder could not be reached, or failed to answer.
+    """
+    try:
+        cert = x509.load_pem_x509_certificate(cert_pem.encode())
+        url = _responder_url(cert)
+        issuer = _issuer(cert, issuer_pems)
+    except ValueError as e:
+        logger.warning("Cannot staple an OCSP response for an unreadable certificate: %s", e)
+        return None
+    if not url or not issuer:
+        return None
+
+    request = (
+        ocsp.OCSPRequestBuilder()
+        .add_certificate(cert, issuer, hashes.SHA1())
+        .build()
+        .public_bytes(serialization.Encoding.DER)
+    )
+    try:
+        with urllib.request.urlopen(
+            urllib.request.Request(
+                url, data=request, headers={"Content-Type": "application/ocsp-request"}
+            ),
+            timeout=TIMEOUT,
+        ) as response:
+            data = response.read()
+        parsed = ocsp.load_der_ocsp_response(data)
+    except (URLError, OSError, ValueError) as e:
+        raise OCSPFetchError(f"Failed to fetch OCSP response from {url}: {e}")
+
+    if parsed.response_status != ocsp.OCSPResponseStatus.SUCCESSFUL:
+        raise OCSPFetchError(f"OCSP responder {url} answered {parsed.response_status.name}")
+    if parsed.certificate_status != ocsp.OCSPCertStatus.GOOD:
+        logger.warning(
+            "OCSP responder %s reports the certificate as %s", url, parsed.certificate_status.name
+        )
+        return None
+    return data
+
+
+def ocsp_response_expiring(data: bytes, margin: timedelta = REFRESH_MARGIN) -> bool:
+    """Whether a DER-encoded OCSP response expires within the margin, and should be refreshed.
+
+    With no margin, whether it has expired, and can no longer be stapled.
+    """
+    try:
+        next_update = ocsp.load_der_ocsp_response(data).next_update_utc
+    except ValueError:
+        return True
+    if next_update is None:
+        return True
+    return next_update - datetime.now(timezone.utc) < margin
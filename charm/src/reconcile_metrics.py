@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Timings of the charm's reconcile passes and of the Pebble calls they make."""
+
+import io
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from ops.model import Container
+
+
+class ReconcileMetrics:
+    """Time spent in each phase of a dispatch, and the Pebble traffic it caused."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.pebble_calls: Counter = Counter()
+        self.bytes_pushed = 0
+        self.bytes_pulled = 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the time spent in the block to the phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def span_attributes(self) -> Dict[str, float]:
+        """The metrics, as attributes of a tracing span."""
+        attributes: Dict[str, float] = {
+            f"reconcile.phase.{name}.seconds": seconds for name, seconds in self.phases.items()
+        }
+        attributes.update(
+            {f"pebble.calls.{method}": count for method, count in self.pebble_calls.items()}
+        )
+        attributes["pebble.calls"] = sum(self.pebble_calls.values())
+        attributes["pebble.bytes_pushed"] = self.bytes_pushed
+        attributes["pebble.bytes_pulled"] = self.bytes_pulled
+        return attributes
+
+    def render(self, timestamp: float) -> str:
+        """The metrics, in the Prometheus text exposition format."""
+        lines = [
+            "# HELP catalogue_reconcile_timestamp_seconds When the last reconcile finished",
+            "# TYPE catalogue_reconcile_timestamp_seconds gauge",
+            f"catalogue_reconcile_timestamp_seconds {timestamp:.3f}",
+            "# HELP catalogue_reconcile_phase_seconds Time spent in each phase of the last reconcile",
+            "# TYPE catalogue_reconcile_phase_seconds gauge",
+        ]
+        lines += [
+            f'catalogue_reconcile_phase_seconds{{phase="{name}"}} {seconds:.6f}'
+            for name, seconds in sorted(self.phases.items())
+        ]
+        lines += [
+            "# HELP catalogue_reconcile_pebble_calls Pebble calls made by the last reconcile",
+            "# TYPE catalogue_reconcile_pebble_calls gauge",
+        ]
+        lines += [
+            f'catalogue_reconcile_pebble_calls{{method="{method}"}} {count}'
+            for method, count in sorted(self.pebble_calls.items())
+        ]
+        lines += [
+            "# HELP catalogue_reconcile_pebble_bytes Bytes transferred by the last reconcile",
+            "# TYPE catalogue_reconcile_pebble_bytes gauge",
+            f'catalogue_reconcile_pebble_bytes{{direction="pushed"}} {self.bytes_pushed}',
+            f'catalogue_reconcile_pebble_bytes{{direction="pulled"}} {self.bytes_pulled}',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class CountingContainer:
+    """A container recording the Pebble calls made through it.
+
+    Pulled files are read whole, so that their size can be accounted for; the
+    charm only pulls small config files, which it reads whole anyway.
+    """
+
+    def __init__(self, container: Container, metrics: ReconcileMetrics):
+        self._container = container
+        self._metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        """Count calls to any other public method of the container."""
+        attribute = getattr(self._container, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            self._metrics.pebble_calls[name] += 1
+            return attribute(*args, **kwargs)
+
+        return counted
+
+    def push(self, path, source, *args, **kwargs):
+        """Push a file, counting the bytes written."""
+        self._metrics.pebble_calls["push"] += 1
+        if isinstance(source, str):
+            self._metrics.bytes_pushed += len(source.encode("utf-8"))
+        elif isinstance(source, bytes):
+            self._metrics.bytes_pushed += len(source)
+        return self._container.push(path, source, *args, **kwargs)
+
+    def pull(self, path, *, encoding="utf-8"):
+        """Pull a file, counting the bytes read."""
+        self._metrics.pebble_calls["pull"] += 1
+        data = self._container.pull(path, encoding=None).read()
+        self._metrics.bytes_pulled += len(data)
+        if encoding is None:
+            return io.BytesIO(data)
+        return io.StringIO(data.decode(encoding))
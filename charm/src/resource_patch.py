@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Compute resources of the workload container, patched into the StatefulSet."""
+
+import logging
+from typing import Dict
+
+from ops.charm import CharmBase
+
+# lightkube, and the HTTP client it comes with, are only imported when the
+# limits are actually set: most dispatches have nothing to do with them.
+
+logger = logging.getLogger(__name__)
+
+
+class ResourcePatchError(Exception):
+    """Raised when the StatefulSet could not be read or patched."""
+
+
+def quantity(value: str) -> float:
+    """The value of a Kubernetes quantity, e.g. 0.5 for "500m".
+
+    Raises:
+        ValueError: if the quantity is not valid.
+    """
+    from lightkube.utils.quantity import parse_quantity
+
+    parsed = parse_quantity(value)
+    if parsed is None:
+        raise ValueError(f"Invalid quantity: {value!r}")
+    return float(parsed)
+
+
+def resource_limits(cpu: str, memory: str) -> Dict[str, str]:
+    """The resource limits for the given cpu and memory quantities, either of which may be empty.
+
+    Raises:
+        ValueError: if a quantity is not valid.
+    """
+    limits = {"cpu": cpu, "memory": memory}
+    for name, value in limits.items():
+        if value and not quantity(value) > 0:
+            raise ValueError(f"Invalid {name} quantity: {value!r}")
+    return {name: value for name, value in limits.items() if value}
+
+
+class ResourcePatch:
+    """Requests and limits of a container of the charm's pod.
+
+    Juju creates the StatefulSet without any, so they are patched into its pod
+    template, which makes Kubernetes roll the pods. The requests are set equal
+    to the limits, so that the pod's capacity is guaranteed.
+    """
+
+    def __init__(self, charm: CharmBase, container_name: str):
+        self._charm = charm
+        self._container_name = container_name
+
+    def apply(self, limits: Dict[str, str]) -> bool:
+        """Patch the container with the limits, unless it already has them.
+
+        The container's resources are replaced as a whole, so that a limit no
+        longer set is removed, whichever others still are.
+
+        Returns:
+            Whether the StatefulSet was patched.
+
+        Raises:
+            ResourcePatchError: if the StatefulSet could not be read or patched, e.g. because
+                the application is not trusted or the API server is unreachable.
+        """
+        import httpx
+        from lightkube import Client
+        from lightkube.core.exceptions import ApiError, ConfigError
+        from lightkube.resources.apps_v1 import StatefulSet
+        from lightkube.types import PatchType
+        from lightkube.utils.quantity import equals_canonically
+
+        name, namespace = self._charm.app.name, self._charm.model.name
+        try:
+            client = Client(field_manager=name)
+            statefulset = client.get(StatefulSet, name=name, namespace=namespace)
+            containers = statefulset.spec.template.spec.containers  # pyright: ignore
+            index = next(
+                (i for i, c in enumerate(containers) if c.name == self._container_name), None
+            )
+            if index is None:
+                raise ResourcePatchError(f"No {self._container_name} container in {name}")
+            current = containers[index].resources
+            current_limits = (current and current.limits) or {}
+            current_requests = (current and current.requests) or {}
+            if equals_canonically(current_limits, limits) and equals_canonically(
+                current_requests, limits
+            ):
+                return False
+
+            path = f"/spec/template/spec/containers/{index}"
+            client.patch(
+                StatefulSet,
+                name,
+                [
+                    # In case the containers were reordered since they were read.
+                    {"op": "test", "path": f"{path}/name", "value": self._container_name},
+                    {
+                        "op": "add",
+                        "path": f"{path}/resources",
+                        "value": {"limits": limits, "requests": limits},
+                    },
+                ],
+                namespace=namespace,
+                patch_type=PatchType.JSON,
+            )
+        except ApiError as e:
+            raise ResourcePatchError(f"Failed to patch {name} resources: {e.status.message}")
+        except (ConfigError, httpx.HTTPError) as e:
+            raise ResourcePatchError(f"Failed to patch {name} resources: {e}")
+        logger.info("Patched %s resource limits: %s", self._container_name, limits or "none")
+        return True
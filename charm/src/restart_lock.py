@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Lock coordinating workload restarts across the catalogue units."""
+
+import json
+import logging
+from typing import List, Optional
+
+from ops.charm import CharmBase
+from ops.model import Relation
+
+logger = logging.getLogger(__name__)
+
+# Unit databag field, set while the unit waits for or holds the lock.
+REQUEST_FIELD = "restart-requested"
+# Peer app databag field: the units currently allowed to restart.
+GRANTED_FIELD = "restart-granted"
+
+
+class RestartLock:
+    """Let at most a given number of units restart their workload at once.
+
+    All the units get the same relation events at about the same time, and
+    would otherwise all restart nginx together. Instead, a unit that needs to
+    restart flags it in its databag over the peer relation, and the leader
+    grants the lock to the first requesters in the app databag. Once done, the
+    unit clears its request, and the leader hands the lock to the next ones.
+    A unit without peers needs no lock.
+    """
+
+    def __init__(self, charm: CharmBase, relation_name: str, max_units: int = 1):
+        self._charm = charm
+        self._relation_name = relation_name
+        self._max_units = max(1, max_units)
+
+    @property
+    def _relation(self) -> Optional[Relation]:
+        return self._charm.model.get_relation(self._relation_name)
+
+    @property
+    def _granted(self) -> List[str]:
+        relation = self._relation
+        if not relation:
+            return []
+        return json.loads(relation.data[self._charm.app].get(GRANTED_FIELD, "[]"))
+
+    @property
+    def pending(self) -> bool:
+        """Whether this unit asked for the lock and did not restart yet."""
+        relation = self._relation
+        return bool(relation and relation.data[self._charm.unit].get(REQUEST_FIELD))
+
+    def acquire(self) -> bool:
+        """Ask for the lock; returns whether this unit may restart now."""
+        relation = self._relation
+        if not (relation and relation.units):
+            return True
+
+        relation.data[self._charm.unit][REQUEST_FIELD] = "true"
+        self.grant()
+        return self._charm.unit.name in self._granted
+
+    def release(self):
+        """Give the lock back, once restarted."""
+        relation = self._relation
+        if not relation:
+            return
+        relation.data[self._charm.unit].pop(REQUEST_FIELD, None)
+        self.grant()
+
+    def grant(self):
+        """As the leader, hand the lock to waiting units, up to the maximum."""
+        relation = self._relation
+        if not (relation and self._charm.unit.is_leader()):
+            return
+
+        requesting = sorted(
+            unit.name
+            for unit in relation.units | {self._charm.unit}
+            if relation.data[unit].get(REQUEST_FIELD)
+        )
+        granted = [name for name in self._granted if name in requesting]
+        for name in requesting:
+            if len(granted) >= self._max_units:
+                break
+            if name not in granted:
+                logger.info("Granting the restart lock to %s", name)
+                granted.append(name)
+        relation.data[self._charm.app][GRANTED_FIELD] = json.dumps(granted)
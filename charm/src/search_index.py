@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Search index builder for the catalogue UI."""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Set
+
+# Fields of a catalogue entry that are searchable.
+INDEXED_FIELDS = ("name", "description", "category")
+# Prefixes up to this length get a precomputed token range.
+PREFIX_LENGTH = 3
+
+_SEPARATOR = re.compile(r"[^a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into normalized search tokens.
+
+    Must be kept in sync with `tokenize` in the UI's `ui.js`.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return [token for token in _SEPARATOR.split(stripped.lower()) if token]
+
+
+class SearchIndexBuilder:
+    """Build a compact inverted index over catalogue entries.
+
+    The index holds the sorted list of distinct tokens, the ids (positions in
+    the `apps` list) of the entries each token appears in, and a prefix table
+    mapping every prefix of up to `PREFIX_LENGTH` characters to the range of
+    tokens starting with it. Since tokens are sorted, any prefix matches a
+    contiguous range, so the UI can narrow down a keystroke to a handful of
+    tokens without scanning the whole catalogue.
+    """
+
+    def __init__(self, items: Iterable[dict]):
+        self._items = list(items)
+
+    def _postings(self) -> Dict[str, Set[int]]:
+        postings: Dict[str, Set[int]] = {}
+        for entry_id, item in enumerate(self._items):
+            for field in INDEXED_FIELDS:
+                for token in tokenize(str(item.get(field) or "")):
+                    postings.setdefault(token, set()).add(entry_id)
+        return postings
+
+    def build(self) -> dict:
+        """Build the search index."""
+        postings = self._postings()
+        tokens = sorted(postings)
+
+        prefixes: Dict[str, List[int]] = {}
+        for position, token in enumerate(tokens):
+            for length in range(1, min(len(token), PREFIX_LENGTH) + 1):
+                prefix = token[:length]
+                if prefix in prefixes:
+                    prefixes[prefix][1] = position + 1
+                else:
+                    prefixes[prefix] = [position, position + 1]
+
+        return {
+            "size": len(self._items),
+            "prefix_length": PREFIX_LENGTH,
+            "tokens": tokens,
+            "postings": [sorted(postings[token]) for token in tokens],
+            "prefixes": prefixes,
+        }
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""TLS session ticket keys shared by all the catalogue units."""
+
+import base64
+import logging
+import os
+from typing import List, Optional
+
+from ops.charm import CharmBase
+from ops.model import Relation, Secret, SecretNotFoundError, SecretRotate
+
+logger = logging.getLogger(__name__)
+
+# nginx expects 80 random bytes per key (AES-256 session tickets).
+TICKET_KEY_SIZE = 80
+SECRET_LABEL = "session-ticket-keys"
+# Peer app databag fields: the id of the secret, and the revision of its
+# content, bumped on rotation so every unit picks up the new keys.
+SECRET_ID_FIELD = "session-ticket-keys-secret-id"
+REVISION_FIELD = "session-ticket-keys-revision"
+
+
+def _encode(key: bytes) -> str:
+    return base64.b64encode(key).decode()
+
+
+class SessionTicketKeys:
+    """Session ticket keys generated by the leader and shared over the peer relation.
+
+    Each nginx would otherwise encrypt session tickets with its own random
+    keys, so a client resuming its session on another unit would have to go
+    through a full handshake. The leader keeps the keys in a Juju secret,
+    rotated daily: the current key encrypts new tickets, and the previous one
+    is kept to decrypt tickets issued before the rotation.
+    """
+
+    def __init__(self, charm: CharmBase, relation_name: str):
+        self._charm = charm
+        self._relation_name = relation_name
+
+    @property
+    def _relation(self) -> Optional[Relation]:
+        return self._charm.model.get_relation(self._relation_name)
+
+    @property
+    def _supported(self) -> bool:
+        return self._charm.model.juju_version.has_secrets
+
+    def ensure(self):
+        """Generate the keys, if the leader did not do so already."""
+        relation = self._relation
+        if not (self._supported and relation and self._charm.unit.is_leader()):
+            return
+        if relation.data[self._charm.app].get(SECRET_ID_FIELD):
+            return
+
+        secret = self._charm.app.add_secret(
+            {"current": _encode(os.urandom(TICKET_KEY_SIZE))},
+            label=SECRET_LABEL,
+            rotate=SecretRotate.DAILY,
+        )
+        relation.data[self._charm.app].update(
+            {SECRET_ID_FIELD: secret.id or "", REVISION_FIELD: "1"}
+        )
+        logger.info("Generated TLS session ticket keys")
+
+    def rotate(self, secret: Secret):
+        """Start encrypting tickets with a new key, keeping the current one for decryption."""
+        relation = self._relation
+        if not (relation and self._charm.unit.is_leader()):
+            return
+
+        current = secret.get_content(refresh=True)["current"]
+        secret.set_content({"current": _encode(os.urandom(TICKET_KEY_SIZE)), "previous": current})
+        revision = int(relation.data[self._charm.app].get(REVISION_FIELD, "0")) + 1
+        relation.data[self._charm.app][REVISION_FIELD] = str(revision)
+        logger.info("Rotated TLS session ticket keys")
+
+    @property
+    def keys(self) -> List[bytes]:
+        """The current key, then the previous one if any; empty until the leader made them."""
+        relation = self._relation
+        if not (self._supported and relation):
+            return []
+        secret_id = relation.data[self._charm.app].get(SECRET_ID_FIELD)
+        if not secret_id:
+            return []
+
+        try:
+            content = self._charm.model.get_secret(id=secret_id).get_content(refresh=True)
+        except SecretNotFoundError:
+            logger.warning("TLS session ticket keys secret %s not found", secret_id)
+            return []
+        return [
+            base64.b64decode(content[field])
+            for field in ("current", "previous")
+            if field in content
+        ]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Sharded layout of the catalogue config for large catalogues."""
+
+import hashlib
+import json
+from typing import List
+
+# Directory, relative to the web root, holding the shard files.
+SHARDS_DIR = "apps"
+
+
+def shard_path(number: int) -> str:
+    """Path of a shard file, relative to the web root."""
+    return f"{SHARDS_DIR}/{number}.json"
+
+
+def digest(content) -> str:
+    """Short, stable digest of JSON-serializable content."""
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class CatalogueShards:
+    """Split catalogue entries into fixed-size pages.
+
+    Instead of a single config.json holding every entry, the UI is served a
+    small manifest with the header fields, the total number of entries and
+    one record per page (path, entry count and content digest). The pages
+    themselves are written to separate files the UI fetches on demand; the
+    digests let the charm rewrite only the pages whose content changed.
+    """
+
+    def __init__(self, items: List[dict], page_size: int):
+        self._items = items
+        self._page_size = page_size
+
+    @property
+    def pages(self) -> List[List[dict]]:
+        """Entries split into pages of at most `page_size` entries."""
+        return [
+            self._items[start : start + self._page_size]
+            for start in range(0, len(self._items), self._page_size)
+        ]
+
+    def manifest(self, header: dict) -> dict:
+        """The manifest served as config.json in place of the full catalogue."""
+        return {
+            **header,
+            "apps_count": len(self._items),
+            "page_size": self._page_size,
+            "pages": [
+                {"path": shard_path(number), "count": len(page), "digest": digest(page)}
+                for number, page in enumerate(self.pages)
+            ],
+        }
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""What the charm_tracing wrapper costs a method call, when nothing is being traced.
+
+The unit tests check that untraced dispatches do not instrument anything; this
+shows what that saves. Timings depend on the machine, so nothing is asserted.
+"""
+
+import timeit
+
+from charms.tempo_k8s.v1.charm_tracing import trace_method
+
+NUMBER = 10000
+REPEAT = 5
+
+
+class Probe:
+    def call(self):
+        pass
+
+
+def main():
+    probe, traced = Probe(), trace_method(Probe.call)
+    plain = min(timeit.repeat(probe.call, number=NUMBER, repeat=REPEAT)) / NUMBER
+    wrapped = min(timeit.repeat(lambda: traced(probe), number=NUMBER, repeat=REPEAT)) / NUMBER
+    print(f"plain call:   {plain * 1e9:8.0f} ns")
+    print(f"traced call:  {wrapped * 1e9:8.0f} ns ({wrapped / plain:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Server-sent events announcing catalogue changes.
+
+Every client connected to /events is sent the current catalogue version, and
+then the new one each time the charm signals (with SIGHUP) that it swapped in
+a new config.json. Idle connections get a comment line every now and then so
+proxies do not time them out.
+"""
+
+import json
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VERSION_PATH = "/web/version.json"
+KEEPALIVE_INTERVAL = 15
+# Delay, in milliseconds, before browsers reconnect after losing the stream.
+RETRY_DELAY = 1000
+
+
+class Version:
+    """The catalogue version, and a condition to wait for it to change."""
+
+    def __init__(self):
+        self.changed = threading.Condition()
+        self.value = self._read()
+
+    @staticmethod
+    def _read() -> str:
+        try:
+            with open(VERSION_PATH) as f:
+                return json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            return ""
+
+    def reload(self):
+        """Re-read the version file and wake up the clients if it changed."""
+        value = self._read()
+        with self.changed:
+            if value != self.value:
+                self.value = value
+                self.changed.notify_all()
+
+
+VERSION = Version()
+
+
+class EventsHandler(BaseHTTPRequestHandler):
+    """Streams version events to a single client."""
+
+    def do_GET(self):  # noqa: N802
+        """Serve the event stream."""
+        if self.path.split("?")[0] != "/events":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+
+        sent = None
+        try:
+            self._write(f"retry: {RETRY_DELAY}\n\n")
+            while True:
+                with VERSION.changed:
+                    VERSION.changed.wait_for(lambda: VERSION.value != sent, KEEPALIVE_INTERVAL)
+                    current = VERSION.value
+                if current != sent:
+                    self._write(f"data: {json.dumps({'version': current})}\n\n")
+                    sent = current
+                else:
+                    self._write(": keepalive\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def _write(self, data: str):
+        self.wfile.write(data.encode("utf-8"))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Do not log every connection."""
+
+
+def main(port: int):
+    """Serve events on localhost until terminated."""
+    # The handler runs in the main thread, which must not block on the
+    # condition lock while a client thread holds it.
+    signal.signal(
+        signal.SIGHUP, lambda *_: threading.Thread(target=VERSION.reload, daemon=True).start()
+    )
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), EventsHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8081)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Prometheus metrics for the catalogue web server.
+
+On every scrape of /metrics, nginx's stub_status page is fetched and turned
+into connection and request metrics, and the log nginx keeps of the requests
+it answered with a server error is read from where the previous scrape left
+off, to count them by status code. Like any Prometheus counter, the count
+starts from zero when the exporter does; the log is rotated once large.
+Metrics the charm writes to *.prom files in the textfiles directory, e.g.
+about its reconcile passes, are served too.
+"""
+
+import glob
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.error import URLError
+
+from nginx_logs import LogFollower
+
+STUB_STATUS_URL = "http://127.0.0.1:8082/stub_status"
+SERVER_ERRORS_LOG_PATH = "/var/log/nginx/server-errors.log"
+TEXTFILES_DIR = "/var/lib/catalogue-exporter"
+TIMEOUT = 2
+
+# name: (type, help), in the order they are rendered.
+STUB_STATUS_METRICS = {
+    "nginx_connections_active": ("gauge", "Active client connections"),
+    "nginx_connections_accepted": ("counter", "Accepted client connections"),
+    "nginx_connections_handled": ("counter", "Handled client connections"),
+    "nginx_connections_reading": ("gauge", "Connections where nginx is reading the request"),
+    "nginx_connections_writing": ("gauge", "Connections where nginx is writing the response"),
+    "nginx_connections_waiting": ("gauge", "Idle client connections"),
+    "nginx_http_requests_total": ("counter", "Total HTTP requests"),
+}
+
+
+def parse_stub_status(text: str) -> Dict[str, int]:
+    """Parse the stub_status page, e.g.
+
+    Active connections: 2
+    server accepts handled requests
+     16 16 31
+    Reading: 0 Writing: 1 Waiting: 1
+    """
+    lines = text.splitlines()
+    accepted, handled, requests = (int(value) for value in lines[2].split())
+    fields = lines[3].split()
+    return {
+        "nginx_connections_active": int(lines[0].split(":")[1]),
+        "nginx_connections_accepted": accepted,
+        "nginx_connections_handled": handled,
+        "nginx_connections_reading": int(fields[1]),
+        "nginx_connections_writing": int(fields[3]),
+        "nginx_connections_waiting": int(fields[5]),
+        "nginx_http_requests_total": requests,
+    }
+
+
+class ServerErrors:
+    """Count of the server errors logged since the exporter started, by status code."""
+
+    def __init__(self, path: str):
+        self._log = LogFollower(path)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def update(self) -> Dict[str, int]:
+        """Account for the lines logged since the last update."""
+        with self._lock:
+            for line in self._log.read():
+                if status := line.strip():
+                    self.counts[status] = self.counts.get(status, 0) + 1
+            return dict(self.counts)
+
+
+SERVER_ERRORS = ServerErrors(SERVER_ERRORS_LOG_PATH)
+
+
+def _stub_status() -> Optional[Dict[str, int]]:
+    try:
+        with urllib.request.urlopen(STUB_STATUS_URL, timeout=TIMEOUT) as response:
+            return parse_stub_status(response.read().decode("utf-8"))
+    except (URLError, OSError, ValueError, IndexError):
+        return None
+
+
+def _textfiles() -> str:
+    contents = []
+    for path in sorted(glob.glob(f"{TEXTFILES_DIR}/*.prom")):
+        try:
+            with open(path) as f:
+                contents.append(f.read())
+        except OSError:
+            continue
+    return "".join(contents)
+
+
+def render() -> str:
+    """The metrics, in the Prometheus text exposition format."""
+    status = _stub_status()
+    lines = [
+        "# HELP nginx_up Whether the stub_status page could be read",
+        "# TYPE nginx_up gauge",
+        f"nginx_up {1 if status else 0}",
+    ]
+    for name, (kind, description) in STUB_STATUS_METRICS.items():
+        if status:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            lines.append(f"{name} {status[name]}")
+
+    lines += [
+        "# HELP nginx_http_server_errors_total HTTP responses with a 5xx status",
+        "# TYPE nginx_http_server_errors_total counter",
+    ]
+    for code, count in sorted(SERVER_ERRORS.update().items()):
+        lines.append(f'nginx_http_server_errors_total{{status="{code}"}} {count}')
+    return "\n".join(lines) + "\n" + _textfiles()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics to Prometheus."""
+
+    def do_GET(self):  # noqa: N802
+        """Serve /metrics."""
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Do not log every scrape."""
+
+
+def main(port: int):
+    """Serve metrics until terminated."""
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 9113)
@@ -0,0 +1,41 @@
+#!/bin/sh
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+#
+# Run nginx in the foreground, shutting it down gracefully on SIGTERM, which is
+# what Pebble stops services with. First the health endpoint starts failing, so
+# that the unit loses readiness and ingress stops routing new requests to it;
+# then nginx gets SIGQUIT, stops accepting connections and exits once the
+# requests in flight are served. SIGHUP, which the charm sends for nginx to
+# reload its config, is passed on.
+#
+# Arguments are passed on to nginx.
+
+DRAIN_MARKER=/run/catalogue-draining
+DRAIN_DELAY=${CATALOGUE_DRAIN_DELAY:-10}
+
+rm -f "$DRAIN_MARKER"
+# Pebble signals the whole process group of the service: nginx gets a session
+# of its own, so that only this script sees the SIGTERM, and nginx the SIGQUIT
+# once drained. Not being a process group leader, setsid execs nginx in place,
+# so $! is nginx's pid.
+setsid nginx -g 'daemon off;' "$@" &
+pid=$!
+
+drain() {
+    touch "$DRAIN_MARKER"
+    sleep "$DRAIN_DELAY"
+    kill -QUIT "$pid"
+}
+trap drain TERM
+# nginx is in a session of its own: pass on reloads.
+trap 'kill -HUP "$pid"' HUP
+
+# wait returns as soon as a trapped signal is handled: wait again until nginx exits.
+status=0
+while kill -0 "$pid" 2>/dev/null; do
+    wait "$pid"
+    status=$?
+done
+rm -f "$DRAIN_MARKER"
+exit "$status"
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Reading the logs nginx writes, as the workload scripts that account for them do.
+
+Installed next to those scripts, which import it from there.
+"""
+
+import os
+import signal
+from typing import BinaryIO, List, Optional
+
+NGINX_PID_PATH = "/run/nginx.pid"
+# Logs read past this size are rotated.
+MAX_LOG_SIZE = 8 * 1024 * 1024
+
+
+class LogFollower:
+    """The lines appended to a log nginx writes, which it rotates once too large.
+
+    The log is followed through its file, not its path: once rotated, the
+    lines nginx appended to the old file before reopening its logs are still
+    read, then the new file from its start.
+    """
+
+    def __init__(self, path: str, max_size: int = MAX_LOG_SIZE):
+        self._path = path
+        self._max_size = max_size
+        self._file: Optional[BinaryIO] = None
+        self._partial = b""
+        # What was logged before the reader started was already accounted for, if ever.
+        self._open(at_end=True)
+
+    def _open(self, at_end: bool = False):
+        try:
+            self._file = open(self._path, "rb")
+        except OSError:
+            self._file = None
+            return
+        if at_end:
+            self._file.seek(0, os.SEEK_END)
+
+    def _rotated(self) -> bool:
+        try:
+            return os.stat(self._path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            return False
+
+    def _rotate(self):
+        """Move the log aside, and have nginx reopen its logs, which creates a new one."""
+        try:
+            os.replace(self._path, self._path + ".1")
+            with open(NGINX_PID_PATH) as f:
+                os.kill(int(f.read().strip()), signal.SIGUSR1)
+        except (OSError, ValueError):
+            pass
+
+    def read(self) -> List[str]:
+        """The complete lines logged since the last read."""
+        if not self._file:
+            self._open()
+            if not self._file:
+                return []
+
+        if os.fstat(self._file.fileno()).st_size < self._file.tell():
+            # Truncated.
+            self._file.seek(0)
+            self._partial = b""
+        data = self._partial + self._file.read()
+        # Leave a partially written line for the next read.
+        complete, self._partial = data[: data.rfind(b"\n") + 1], data[data.rfind(b"\n") + 1 :]
+        lines = complete.decode("utf-8", "replace").splitlines()
+
+        if self._rotated():
+            self._file.close()
+            self._partial = b""
+            self._open()
+            return lines + self.read()
+        if self._file.tell() > self._max_size:
+            self._rotate()
+        return lines
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""OpenTelemetry spans for the requests nginx serves.
+
+nginx logs a JSON line per request to the request traces log, which is read
+every few seconds from where the previous read left off, and rotated once
+large; each line becomes a server span, sent to the OTLP/HTTP endpoint in the
+JSON encoding. Tracing is best effort: spans that fail to be sent are dropped.
+Requests carrying a W3C traceparent header get a span in the caller's trace,
+the others a trace of their own, identified by nginx's request id.
+
+Configured through the standard OpenTelemetry environment variables:
+OTEL_EXPORTER_OTLP_TRACES_ENDPOINT, OTEL_EXPORTER_OTLP_TRACES_CERTIFICATE,
+OTEL_SERVICE_NAME and OTEL_RESOURCE_ATTRIBUTES.
+"""
+
+import json
+import os
+import secrets
+import ssl
+import time
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from nginx_logs import LogFollower
+
+REQUEST_TRACES_LOG_PATH = "/var/log/nginx/request-traces.log"
+INTERVAL = 5
+TIMEOUT = 5
+MAX_BATCH = 1000
+
+SPAN_KIND_SERVER = 2
+STATUS_CODE_ERROR = 2
+
+
+def parse_traceparent(header: str) -> Optional[Tuple[str, str, bool]]:
+    """Trace id, parent span id and sampled flag of a W3C traceparent header, if valid."""
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def span(line: str) -> Optional[dict]:
+    """The span of a logged request, None if the caller did not sample its trace."""
+    entry = json.loads(line)
+    trace_id, parent_span_id = entry["request_id"], ""
+    if parent := parse_traceparent(entry.get("traceparent", "")):
+        trace_id, parent_span_id, sampled = parent
+        if not sampled:
+            return None
+
+    end = int(float(entry["msec"]) * 1e9)
+    start = end - int(float(entry["request_time"]) * 1e9)
+    path = entry["uri"].split("?")[0]
+    status = int(entry["status"])
+    attributes = [
+        _attribute("http.request.method", entry["method"]),
+        _attribute("url.path", path),
+        _attribute("url.scheme", entry["scheme"]),
+        _attribute("server.address", entry["host"]),
+        _attribute("server.port", int(entry["server_port"])),
+        _attribute("http.response.status_code", status),
+        _attribute("http.response.body.size", int(entry["body_bytes_sent"])),
+        _attribute("user_agent.original", entry["user_agent"]),
+        _attribute("nginx.request_id", entry["request_id"]),
+    ]
+    result = {
+        "traceId": trace_id,
+        "spanId": secrets.token_hex(8),
+        "name": f"{entry['method']} {path}",
+        "kind": SPAN_KIND_SERVER,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(end),
+        "attributes": attributes,
+    }
+    if parent_span_id:
+        result["parentSpanId"] = parent_span_id
+    if status >= 500:
+        result["status"] = {"code": STATUS_CODE_ERROR}
+    return result
+
+
+def resource_attributes() -> Dict[str, str]:
+    """The attributes of the spans' resource, from the environment."""
+    attributes = {}
+    for pair in os.environ.get("OTEL_RESOURCE_ATTRIBUTES", "").split(","):
+        key, _, value = pair.partition("=")
+        if key.strip():
+            attributes[key.strip()] = value.strip()
+    attributes["service.name"] = os.environ.get("OTEL_SERVICE_NAME", "catalogue")
+    return attributes
+
+
+def export(endpoint: str, spans: List[dict], context: Optional[ssl.SSLContext]):
+    """Send the spans to the endpoint, as an OTLP/HTTP JSON request."""
+    body = {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [_attribute(k, v) for k, v in resource_attributes().items()]
+                },
+                "scopeSpans": [{"scope": {"name": "catalogue-tracer"}, "spans": spans}],
+            }
+        ]
+    }
+    request = urllib.request.Request(
+        endpoint,
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=TIMEOUT, context=context):
+        pass
+
+
+def main():
+    """Send the spans of the requests served, until terminated."""
+    endpoint = os.environ["OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"]
+    ca_path = os.environ.get("OTEL_EXPORTER_OTLP_TRACES_CERTIFICATE")
+    context = ssl.create_default_context(cafile=ca_path) if ca_path else None
+    log = LogFollower(REQUEST_TRACES_LOG_PATH)
+    while True:
+        time.sleep(INTERVAL)
+        spans = []
+        for line in log.read():
+            try:
+                if request_span := span(line):
+                    spans.append(request_span)
+            except (ValueError, KeyError):
+                continue
+        for i in range(0, len(spans), MAX_BATCH):
+            try:
+                export(endpoint, spans[i : i + MAX_BATCH], context)
+            except OSError:
+                # Dropped rather than piling up while the endpoint is unreachable.
+                break
+
+
+if __name__ == "__main__":
+    main()
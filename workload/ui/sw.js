@@ -0,0 +1,173 @@
+// Service worker caching the catalogue UI, so repeat visits render straight
+// from the cache:
+// - the static assets are precached, in a cache named after the version of
+//   the rock they ship in, and served from it;
+// - config.json and search-index.json are served stale-while-revalidate,
+//   and open pages are told when the revalidated copy turned out to differ;
+// - shards are addressed by their digest, so they are served from the
+//   cache once fetched, until a fetched config.json no longer lists them;
+// - icons from the iconify API are served stale-while-revalidate;
+// - version.json and the events stream always go to the network.
+
+// Replaced with the rock version at build time.
+const VERSION = '@VERSION@'
+const STATIC_CACHE = 'catalogue-static-' + VERSION
+const DATA_CACHE = 'catalogue-data'
+const ICON_CACHE = 'catalogue-icons'
+
+const STATIC_ASSETS = [
+  './',
+  'index.html',
+  'ui.css',
+  'ui.js',
+  'vanilla-framework-3.7.1.min.css',
+  'handlebars.min.js',
+  'iconify.min.js',
+  'favicon.ico',
+]
+const REVALIDATED = ['config.json', 'search-index.json']
+const NETWORK_ONLY = ['version.json', 'events']
+const ICON_API = 'api.iconify.design'
+
+const scope = new URL(self.registration.scope)
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(STATIC_CACHE)
+      .then(cache => cache.addAll(STATIC_ASSETS))
+      .then(() => self.skipWaiting())
+  )
+})
+
+self.addEventListener('activate', event => {
+  const current = [STATIC_CACHE, DATA_CACHE, ICON_CACHE]
+  event.waitUntil(
+    caches.keys()
+      .then(names => Promise.all(
+        names.filter(name => !current.includes(name)).map(name => caches.delete(name))
+      ))
+      .then(() => self.clients.claim())
+  )
+})
+
+function notifyClients(path) {
+  return self.clients.matchAll().then(clients => {
+    clients.forEach(client => client.postMessage({ type: 'catalogue-changed', path: path }))
+  })
+}
+
+// Every change to a sharded catalogue leaves the shards of the previous
+// digests behind in the cache: once config.json is refreshed, only the shards
+// its manifest lists are kept.
+function pruneShards(cache, response) {
+  return response.json().then(config => {
+    const current = (config.pages || [])
+      .map(page => new URL(page.path + '?v=' + page.digest, scope).href)
+    return cache.keys().then(requests => Promise.all(
+      requests
+        .filter(request => new URL(request.url).pathname.startsWith(scope.pathname + 'apps/'))
+        .filter(request => !current.includes(request.url))
+        .map(request => cache.delete(request))
+    ))
+  }).catch(() => undefined)
+}
+
+function onRefreshed(path) {
+  return path == 'config.json' ? pruneShards : undefined
+}
+
+// Answers from the cache if possible, and refreshes the cache from the
+// network either way. `onChange` is called when the refreshed response
+// differs from the one served, `onStored` with the cache and the response
+// once stored.
+function staleWhileRevalidate(event, cacheName, onChange, onStored) {
+  return caches.open(cacheName).then(cache => cache.match(event.request).then(cached => {
+    const refreshed = fetch(event.request).then(response => {
+      if (!response.ok && response.type != 'opaque') {
+        return response
+      }
+      const stored = cache.put(event.request, response.clone())
+      if (onStored) {
+        const copy = response.clone()
+        event.waitUntil(stored.then(() => onStored(cache, copy)))
+      }
+      if (cached && onChange) {
+        Promise.all([cached.clone().text(), response.clone().text()])
+          .then(([before, after]) => before != after && stored.then(onChange))
+      }
+      return response
+    })
+
+    if (cached) {
+      event.waitUntil(refreshed.catch(() => undefined))
+      return cached
+    }
+    return refreshed
+  }))
+}
+
+function cacheFirst(event, cacheName) {
+  return caches.open(cacheName).then(cache => cache.match(event.request).then(cached => {
+    if (cached) {
+      return cached
+    }
+    return fetch(event.request).then(response => {
+      if (response.ok) {
+        cache.put(event.request, response.clone())
+      }
+      return response
+    })
+  }))
+}
+
+// Fetches from the network and keeps the cache up to date, for pages that
+// know the cached copy is out of date.
+function networkFirst(event, cacheName, onStored) {
+  return fetch(event.request).then(response => {
+    if (response.ok) {
+      const copy = response.clone()
+      const stored = onStored && response.clone()
+      event.waitUntil(caches.open(cacheName).then(cache => cache.put(event.request.url, copy)
+        .then(() => stored && onStored(cache, stored))))
+    }
+    return response
+  }).catch(() => caches.match(event.request.url))
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request
+  if (request.method != 'GET') {
+    return
+  }
+
+  const url = new URL(request.url)
+  if (url.hostname == ICON_API) {
+    event.respondWith(staleWhileRevalidate(event, ICON_CACHE))
+    return
+  }
+  if (url.origin != scope.origin || !url.pathname.startsWith(scope.pathname)) {
+    return
+  }
+
+  const path = url.pathname.slice(scope.pathname.length)
+  if (NETWORK_ONLY.includes(path)) {
+    return
+  }
+  if (REVALIDATED.includes(path)) {
+    if (request.cache == 'reload') {
+      event.respondWith(networkFirst(event, DATA_CACHE, onRefreshed(path)))
+    } else {
+      event.respondWith(
+        staleWhileRevalidate(event, DATA_CACHE, () => notifyClients(path), onRefreshed(path))
+      )
+    }
+    return
+  }
+  if (path.startsWith('apps/')) {
+    event.respondWith(cacheFirst(event, DATA_CACHE))
+    return
+  }
+  if (path == '' || STATIC_ASSETS.includes(path)) {
+    event.respondWith(cacheFirst(event, STATIC_CACHE))
+  }
+})
@@ -1,26 +1,559 @@
 (function() {
 
-  fetch('config.json')
-    .then(response => response.json())
-    .then(data => {
+  // Entries are laid out three per row in a p-matrix.
+  const COLUMNS = 3
+  // Rough height of a matrix row, used to size chunks to the viewport.
+  const ROW_HEIGHT = 120
+  // Extra rows rendered beyond the viewport so scrolling stays smooth.
+  const OVERSCAN_ROWS = 2
+  // How far outside the viewport an entry starts being materialized.
+  const ROOT_MARGIN = '200px'
+  // How often, in milliseconds, to check whether the catalogue changed.
+  const REFRESH_INTERVAL = 30000
 
-      if (data.apps && data.apps.length > 0) {
-        while (data.apps.length % 3 != 0) {
-          data.apps.push({})
+  const lazySupported = 'IntersectionObserver' in window
+
+  function pad(list) {
+    while (list.length % COLUMNS != 0) {
+      list.push({})
+    }
+    return list
+  }
+
+  function chunkSize() {
+    const rows = Math.ceil(window.innerHeight / ROW_HEIGHT) + OVERSCAN_ROWS
+    return rows * COLUMNS
+  }
+
+  // Fill in the parts of an entry that are expensive to render (the icon,
+  // which iconify turns into an svg, and the description) once it is about
+  // to become visible.
+  function materialize(element, app) {
+    if (!app || element.dataset.materialized) {
+      return
+    }
+    element.dataset.materialized = 'true'
+
+    if (app.icon) {
+      const icon = document.createElement('span')
+      icon.className = 'iconify icon md-48'
+      icon.dataset.icon = 'mdi-' + app.icon
+      element.querySelector('.p-matrix__img').appendChild(icon)
+    }
+    if (app.description) {
+      const description = document.createElement('p')
+      description.className = 'p-matrix__desc'
+      description.textContent = app.description
+      element.querySelector('.p-matrix__content').appendChild(description)
+    }
+  }
+
+  // A source of app entries that can be loaded by range: the `apps` of a
+  // monolithic config.json...
+  function ArraySource(apps) {
+    this.apps = apps
+    this.length = apps.length
+  }
+
+  ArraySource.prototype.load = function(start, end) {
+    return Promise.resolve(this.apps.slice(start, end))
+  }
+
+  // ...the shards listed in the manifest of a sharded config.json, fetched
+  // the first time one of their entries is needed...
+  function ShardedSource(manifest) {
+    this.pages = manifest.pages
+    this.pageSize = manifest.page_size
+    this.length = manifest.apps_count
+    this.fetched = {}
+  }
+
+  ShardedSource.prototype.page = function(number) {
+    if (!(number in this.fetched)) {
+      const page = this.pages[number]
+      this.fetched[number] = fetch(page.path + '?v=' + page.digest)
+        .then(response => response.json())
+        .catch(error => {
+          delete this.fetched[number]
+          throw error
+        })
+    }
+    return this.fetched[number]
+  }
+
+  ShardedSource.prototype.load = function(start, end) {
+    if (start >= end) {
+      return Promise.resolve([])
+    }
+    const first = Math.floor(start / this.pageSize)
+    const last = Math.floor((end - 1) / this.pageSize)
+    const pages = []
+    for (let number = first; number <= last; number++) {
+      pages.push(this.page(number))
+    }
+    return Promise.all(pages).then(loaded => {
+      const offset = start - first * this.pageSize
+      return loaded.flat().slice(offset, offset + end - start)
+    })
+  }
+
+  // ...or the entries of another source matching a search.
+  function FilteredSource(source, ids) {
+    this.source = source
+    this.ids = ids
+    this.length = ids.length
+  }
+
+  FilteredSource.prototype.load = function(start, end) {
+    return Promise.all(
+      this.ids.slice(start, end).map(id => this.source.load(id, id + 1).then(apps => apps[0]))
+    )
+  }
+
+  // Renders the entries of a source into `list` in viewport-sized chunks.
+  // A sentinel placed after the list pulls in the next chunk as it scrolls
+  // into view, and each entry is only materialized when it gets close to
+  // the viewport.
+  function AppList(list, sentinel, renderItem) {
+    this.list = list
+    this.sentinel = sentinel
+    this.renderItem = renderItem
+    this.source = new ArraySource([])
+    this.apps = []
+    this.rendered = 0
+    // Bumped on every `show` or `patch` so chunks still loading for a
+    // previous source are dropped.
+    this.generation = 0
+    this.loading = false
+
+    if (lazySupported) {
+      this.materializer = new IntersectionObserver((entries, observer) => {
+        entries.forEach(entry => {
+          if (!entry.isIntersecting) {
+            return
+          }
+          observer.unobserve(entry.target)
+          materialize(entry.target, this.apps[entry.target.dataset.index])
+        })
+      }, { rootMargin: ROOT_MARGIN })
+
+      this.pager = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+          this.appendChunk()
+        }
+      }, { rootMargin: ROOT_MARGIN })
+    }
+  }
+
+  AppList.prototype.reset = function(source) {
+    this.source = source
+    this.generation++
+    this.loading = false
+    if (lazySupported) {
+      this.pager.disconnect()
+    }
+  }
+
+  AppList.prototype.show = function(source) {
+    this.reset(source)
+    this.apps = []
+    this.rendered = 0
+    this.list.innerHTML = ''
+
+    if (!lazySupported) {
+      this.append(source.length).then(elements => {
+        elements.forEach(element => {
+          materialize(element, this.apps[element.dataset.index])
+        })
+      })
+      return
+    }
+
+    this.materializer.disconnect()
+    this.appendChunk()
+  }
+
+  // Switches to `source` in place: the entries rendered so far are reloaded
+  // from it, and only those whose content changed are re-rendered, so the
+  // page keeps its scroll position.
+  AppList.prototype.patch = function(source) {
+    if (!lazySupported) {
+      this.show(source)
+      return
+    }
+
+    this.reset(source)
+    const generation = this.generation
+    const end = Math.min(Math.max(this.rendered, chunkSize()), source.length)
+
+    source.load(0, end).then(apps => {
+      if (generation != this.generation) {
+        return
+      }
+
+      const previous = Array.from(this.list.children)
+      apps.forEach((app, index) => {
+        if (previous[index] && JSON.stringify(app) == JSON.stringify(this.apps[index])) {
+          return
+        }
+        const [element] = this.render([{ ...app, index: index }])
+        if (previous[index]) {
+          this.materializer.unobserve(previous[index])
+          this.list.replaceChild(element, previous[index])
+        } else {
+          this.list.appendChild(element)
+        }
+        this.materializer.observe(element)
+      })
+      previous.slice(apps.length).forEach(element => {
+        this.materializer.unobserve(element)
+        element.remove()
+      })
+
+      this.apps = apps
+      this.rendered = end
+      this.padIfComplete()
+      this.observeSentinel()
+    }).catch(error => console.error('Failed to load catalogue entries', error))
+  }
+
+  AppList.prototype.render = function(items) {
+    const fragment = document.createElement('template')
+    fragment.innerHTML = items.map(item => this.renderItem(item)).join('')
+    return Array.from(fragment.content.children)
+  }
+
+  // Pads the last row once every entry is rendered.
+  AppList.prototype.padIfComplete = function() {
+    if (this.rendered != this.source.length) {
+      return
+    }
+    const placeholders = []
+    while ((this.rendered + placeholders.length) % COLUMNS != 0) {
+      placeholders.push({ placeholder: true })
+    }
+    this.render(placeholders).forEach(element => this.list.appendChild(element))
+  }
+
+  AppList.prototype.append = function(count) {
+    const generation = this.generation
+    const start = this.rendered
+    const end = Math.min(start + count, this.source.length)
+
+    return this.source.load(start, end).then(apps => {
+      if (generation != this.generation) {
+        return []
+      }
+
+      const elements = this.render(apps.map((app, offset) => {
+        this.apps[start + offset] = app
+        return { ...app, index: start + offset }
+      }))
+      elements.forEach(element => this.list.appendChild(element))
+      this.rendered = end
+      this.padIfComplete()
+      return elements
+    })
+  }
+
+  // Re-observing the sentinel makes the observer report its current state
+  // again, so a sentinel that is still on screen after a chunk pulls in the
+  // next one right away.
+  AppList.prototype.observeSentinel = function() {
+    this.pager.unobserve(this.sentinel)
+    if (this.rendered < this.source.length) {
+      this.pager.observe(this.sentinel)
+    }
+  }
+
+  AppList.prototype.appendChunk = function() {
+    if (this.loading) {
+      return
+    }
+    this.loading = true
+    const generation = this.generation
+
+    this.append(chunkSize())
+      .then(elements => {
+        if (generation != this.generation) {
+          return
+        }
+        elements.forEach(element => this.materializer.observe(element))
+        this.loading = false
+        this.observeSentinel()
+      })
+      .catch(error => {
+        // The sentinel stays observed, so scrolling back to it retries.
+        if (generation == this.generation) {
+          this.loading = false
+        }
+        console.error('Failed to load catalogue entries', error)
+      })
+  }
+
+  // Must be kept in sync with `tokenize` in the charm's search_index.py.
+  function tokenize(text) {
+    return text
+      .normalize('NFKD')
+      .replace(/[\u0300-\u036f]/g, '')
+      .toLowerCase()
+      .split(/[^a-z0-9]+/)
+      .filter(token => token)
+  }
+
+  // Wraps the search index written by the charm next to config.json. Tokens
+  // are sorted, so every prefix maps to a contiguous range of them; the
+  // index carries those ranges for short prefixes and longer ones are
+  // narrowed down with a binary search inside that range.
+  function SearchIndex(index) {
+    this.tokens = index.tokens
+    this.postings = index.postings
+    this.prefixes = index.prefixes
+    this.prefixLength = index.prefix_length
+  }
+
+  SearchIndex.prototype.match = function(prefix) {
+    const ids = new Set()
+    const range = this.prefixes[prefix.slice(0, this.prefixLength)]
+    if (!range) {
+      return ids
+    }
+
+    let [start, end] = range
+    if (prefix.length > this.prefixLength) {
+      let high = end
+      while (start < high) {
+        const middle = (start + high) >>> 1
+        if (this.tokens[middle] < prefix) {
+          start = middle + 1
+        } else {
+          high = middle
         }
       }
-      if (data.links && data.links.length > 0) {
-        while (data.links.length % 3 != 0) {
-          data.links.push({})
+    }
+    for (let token = start; token < end && this.tokens[token].startsWith(prefix); token++) {
+      this.postings[token].forEach(id => ids.add(id))
+    }
+    return ids
+  }
+
+  // Returns the sorted ids of the entries matching every word of `query`
+  // (the last one may be incomplete), or null for an empty query.
+  SearchIndex.prototype.search = function(query) {
+    const terms = tokenize(query)
+    if (terms.length == 0) {
+      return null
+    }
+
+    let result = null
+    for (const term of terms) {
+      const ids = this.match(term)
+      result = result ? new Set([...result].filter(id => ids.has(id))) : ids
+      if (result.size == 0) {
+        break
+      }
+    }
+    return [...result].sort((a, b) => a - b)
+  }
+
+  // Fetches revalidate against the HTTP cache, or with `fresh`, skip both it
+  // and the service worker cache, for when the catalogue is known to have
+  // changed.
+  function fetchJSON(path, fresh) {
+    return fetch(path, { cache: fresh ? 'reload' : 'no-cache' }).then(response => {
+      if (!response.ok) {
+        throw new Error(path + ': ' + response.status)
+      }
+      return response.json()
+    })
+  }
+
+  // Everything in config.json except the entries, which are patched in
+  // place when they change.
+  function headerOf(data) {
+    const { apps, apps_count, pages, page_size, ...header } = data
+    return header
+  }
+
+  function Catalogue(root) {
+    this.root = root
+    this.header = null
+    this.source = null
+    this.liveUpdates = false
+    this.searchIndex = null
+    this.appList = null
+    this.input = null
+    this.noResults = null
+  }
+
+  Catalogue.prototype.load = function(fresh) {
+    return Promise.all([
+      fetchJSON('config.json', fresh),
+      fetchJSON('search-index.json', fresh).catch(() => null),
+    ]).then(([data, index]) => this.update(data, index))
+  }
+
+  Catalogue.prototype.update = function(data, index) {
+    // A sharded config.json only holds a manifest of the app shards.
+    const source = data.pages ? new ShardedSource(data) : new ArraySource(data.apps || [])
+    const header = JSON.stringify(headerOf(data))
+    const rerender = header != this.header
+      || !this.source
+      || (source.length > 0) != (this.source.length > 0)
+
+    this.header = header
+    this.source = source
+    this.liveUpdates = Boolean(data.live_updates)
+    // The index must have been written for this very config.json.
+    this.searchIndex = index && index.size == source.length ? new SearchIndex(index) : null
+
+    if (rerender) {
+      this.render(data)
+    }
+    if (this.input) {
+      this.input.closest('.p-search-box').classList.toggle('u-hide', !this.searchIndex)
+    }
+    this.showApps(!rerender)
+  }
+
+  Catalogue.prototype.render = function(data) {
+    if (data.links && data.links.length > 0) {
+      pad(data.links)
+    }
+
+    const source = document.getElementById('root-template').innerHTML;
+    const template = Handlebars.compile(source)
+    const rendered = template({ ...data, apps: this.source.length > 0 });
+
+    this.root.innerHTML = rendered;
+
+    this.appList = null
+    this.input = document.getElementById('search')
+    this.noResults = document.getElementById('no-results')
+    if (this.source.length == 0) {
+      return
+    }
+
+    const renderItem = Handlebars.compile(document.getElementById('app-template').innerHTML)
+    this.appList = new AppList(
+      document.getElementById('apps'),
+      document.getElementById('apps-sentinel'),
+      renderItem,
+    )
+
+    let pending = false
+    this.input.addEventListener('input', () => {
+      // Coalesce bursts of keystrokes into one update per frame.
+      if (pending) {
+        return
+      }
+      pending = true
+      window.requestAnimationFrame(() => {
+        pending = false
+        this.showApps(false)
+      })
+    })
+  }
+
+  Catalogue.prototype.showApps = function(patch) {
+    if (!this.appList) {
+      return
+    }
+    const ids = this.searchIndex ? this.searchIndex.search(this.input.value) : null
+    const matches = ids ? new FilteredSource(this.source, ids) : this.source
+    this.noResults.classList.toggle('u-hide', matches.length > 0)
+    if (patch) {
+      this.appList.patch(matches)
+    } else {
+      this.appList.show(matches)
+    }
+  }
+
+  // Reloads the catalogue when its version changes. The version is pushed
+  // over a server-sent events stream when the charm has live updates turned
+  // on; otherwise, or if the stream fails, the version file the charm writes
+  // next to config.json is polled. Polls carry the last ETag seen, so as
+  // long as nothing changed nginx answers with an empty 304.
+  function VersionWatcher(catalogue) {
+    this.catalogue = catalogue
+    this.version = null
+    this.etag = null
+    this.timer = null
+  }
+
+  VersionWatcher.prototype.seen = function(version) {
+    const changed = this.version !== null && version != this.version
+    this.version = version
+    if (changed) {
+      return this.catalogue.load(true)
+    }
+  }
+
+  VersionWatcher.prototype.poll = function() {
+    if (document.hidden) {
+      return Promise.resolve()
+    }
+    const headers = this.etag ? { 'If-None-Match': this.etag } : {}
+    return fetch('version.json', { cache: 'no-store', headers: headers })
+      .then(response => {
+        if (response.status == 304 || !response.ok) {
+          return
         }
+        this.etag = response.headers.get('ETag')
+        return response.json().then(data => this.seen(data.version))
+      })
+      .catch(error => console.error('Failed to refresh the catalogue', error))
+  }
+
+  VersionWatcher.prototype.startPolling = function() {
+    if (this.timer === null) {
+      this.timer = window.setInterval(() => this.poll(), REFRESH_INTERVAL)
+      document.addEventListener('visibilitychange', () => this.poll())
+    }
+  }
+
+  VersionWatcher.prototype.listen = function() {
+    const events = new EventSource('events')
+    events.onmessage = event => this.seen(JSON.parse(event.data).version)
+    events.onerror = () => {
+      // The browser reconnects by itself after a dropped connection, but
+      // gives up for good on an error response.
+      if (events.readyState == EventSource.CLOSED) {
+        this.startPolling()
       }
+    }
+  }
 
-      const source = document.getElementById('root-template').innerHTML;
-      const template = Handlebars.compile(source)
-      const rendered = template(data);
+  VersionWatcher.prototype.start = function() {
+    this.poll().then(() => {
+      if (this.catalogue.liveUpdates && 'EventSource' in window) {
+        this.listen()
+      } else {
+        this.startPolling()
+      }
+    })
+  }
 
-      document.getElementById('root').innerHTML = rendered;
-      
+  // The service worker serves the catalogue from its cache first, and tells
+  // the page when the copy it then fetched from the network differs.
+  function registerServiceWorker(catalogue) {
+    if (!('serviceWorker' in navigator)) {
+      return
+    }
+    let pending = null
+    navigator.serviceWorker.addEventListener('message', event => {
+      if (event.data && event.data.type == 'catalogue-changed') {
+        // config.json and search-index.json usually change together.
+        window.clearTimeout(pending)
+        pending = window.setTimeout(() => catalogue.load(), 100)
+      }
     })
+    navigator.serviceWorker.register('sw.js')
+      .catch(error => console.error('Failed to register the service worker', error))
+  }
+
+  const catalogue = new Catalogue(document.getElementById('root'))
+  registerServiceWorker(catalogue)
+  catalogue.load().then(() => new VersionWatcher(catalogue).start())
 
-})()
\ No newline at end of file
+})()